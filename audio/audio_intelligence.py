@@ -1,6 +1,92 @@
 # audio/audio_intelligence.py - Professional Audio Intelligence Layer
 import os
-from typing import Dict, Optional, Tuple
+import logging
+import numpy as np
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+from audio.duration_cache import estimate_duration
+
+logger = logging.getLogger("audio_intel")
+
+# Asset mapping (ENUM → file path)
+_BGM_MAP: Mapping[str, Optional[str]] = MappingProxyType({
+    "calm": "assets/bgm/calm_loop.wav",
+    "tense": "assets/bgm/tense_loop.wav",
+    "heroic": "assets/bgm/heroic_loop.wav",
+    "sad": "assets/bgm/sad_loop.wav",
+    "none": None
+})
+
+_SFX_MAP: Mapping[str, Optional[str]] = MappingProxyType({
+    "punch": "assets/sfx/punch.wav",
+    "slash": "assets/sfx/slash.wav",
+    "explosion": "assets/sfx/explosion.wav",
+    "hit": "assets/sfx/hit.wav",
+    "none": None
+})
+
+_AMBIENCE_MAP: Mapping[str, Optional[str]] = MappingProxyType({
+    "wind": "assets/ambience/wind.wav",
+    "sea": "assets/ambience/sea.wav",
+    "crowd": "assets/ambience/crowd.wav",
+    "room": "assets/ambience/room.wav",
+    "none": None
+})
+
+_STINGER_MAP: Mapping[str, Optional[str]] = MappingProxyType({
+    "intro": "assets/stingers/intro.wav",
+    "outro": "assets/stingers/outro.wav"
+})
+
+# camera_action → SFX offset rule (static and unknown actions → 0.0s)
+_SFX_TIMING_RULES: Dict[str, Callable[[float], float]] = {
+    "shake": lambda d: 0.0,
+    "zoom_in": lambda d: d * 0.5,
+    "zoom_out": lambda d: 0.0,
+    "pan_left": lambda d: 0.0,
+    "pan_right": lambda d: 0.0,
+}
+
+# Camera actions whose impact lands on the first frame
+_IMPACT_AT_START = frozenset({"shake", "zoom_in_fast", "shake_agressive"})
+
+
+@lru_cache(maxsize=128)
+def _sfx_timestamp(camera_action: str, camera_duration: float) -> float:
+    rule = _SFX_TIMING_RULES.get(camera_action)
+    return rule(camera_duration) if rule else 0.0
+
+
+@lru_cache(maxsize=128)
+def _attack_timestamp(camera_action: str, dialogue_duration: float) -> float:
+    if camera_action in _IMPACT_AT_START:
+        return 0.0
+    return dialogue_duration / 2.0
+
+
+@dataclass(slots=True)
+class AudioDecision:
+    """FFmpeg mixing parameters for one scene (output of process_audio_intent)."""
+    bgm_file: Optional[str] = None
+    ambience_file: Optional[str] = None
+    sfx_file: Optional[str] = None
+    sfx_timestamp: Optional[float] = None
+    intro_stinger: Optional[str] = None
+    outro_stinger: Optional[str] = None
+    silence_before: float = 0.0
+    duck_bgm: bool = False
+    layer_count: int = 1
+    narration_placement: str = "none"  # "before"|"over"|"after"|"none"
+    narration_duck_amount: float = 0.0  # 0.0-1.0
+    attack_audio: Optional[str] = None
+    attack_timestamp: Optional[float] = None
+    personality_audio: Optional[str] = None
+    personality_timestamp: Optional[float] = None
+    missing_assets: List[str] = field(default_factory=list)  # For logging
+    character_audio_fallback: bool = False
+
 
 class AudioIntelligence:
     """
@@ -15,45 +101,89 @@ class AudioIntelligence:
     5. 3-layer audio limit (dialogue + 1 bg + 1 impact)
     """
     
-    # Asset mapping (ENUM → file path)
-    BGM_MAP = {
-        "calm": "assets/bgm/calm_loop.wav",
-        "tense": "assets/bgm/tense_loop.wav",
-        "heroic": "assets/bgm/heroic_loop.wav",
-        "sad": "assets/bgm/sad_loop.wav",
-        "none": None
-    }
-    
-    SFX_MAP = {
-        "punch": "assets/sfx/punch.wav",
-        "slash": "assets/sfx/slash.wav",
-        "explosion": "assets/sfx/explosion.wav",
-        "hit": "assets/sfx/hit.wav",
-        "none": None
-    }
-    
-    AMBIENCE_MAP = {
-        "wind": "assets/ambience/wind.wav",
-        "sea": "assets/ambience/sea.wav",
-        "crowd": "assets/ambience/crowd.wav",
-        "room": "assets/ambience/room.wav",
-        "none": None
-    }
-    
-    STINGER_MAP = {
-        "intro": "assets/stingers/intro.wav",
-        "outro": "assets/stingers/outro.wav"
-    }
+    # Read-only views of the module-level asset maps
+    BGM_MAP = _BGM_MAP
+    SFX_MAP = _SFX_MAP
+    AMBIENCE_MAP = _AMBIENCE_MAP
+    STINGER_MAP = _STINGER_MAP
     
     def __init__(self, assets_dir: str = "assets"):
         self.assets_dir = assets_dir
+        
+        # Scan the asset tree once: it never changes mid-run, so every
+        # existence check becomes a set lookup instead of a stat() syscall
+        self._asset_set = frozenset(
+            os.path.join(root, f)
+            for root, _, files in os.walk(assets_dir)
+            for f in files
+        )
+        self._exists = self._asset_set.__contains__
+        self._attack_index = self._build_attack_index()
+        self._validate_assets()
+    
+    def _validate_assets(self):
+        """
+        Check every declared asset once, up-front, and log a single summary.
+        Per-scene resolution then only tests enum membership.
+        """
+        missing = []
+        total = 0
+        available = {}
+        for kind, mapping in (("bgm", _BGM_MAP), ("sfx", _SFX_MAP),
+                              ("ambience", _AMBIENCE_MAP), ("stinger", _STINGER_MAP)):
+            present = set()
+            for enum, path in mapping.items():
+                if path is None:
+                    continue
+                total += 1
+                if self._exists(path):
+                    present.add(enum)
+                else:
+                    missing.append(path)
+            available[kind] = frozenset(present)
+        
+        self._available_bgm = available["bgm"]
+        self._available_sfx = available["sfx"]
+        self._available_ambience = available["ambience"]
+        self._available_stingers = available["stinger"]
+        
+        if missing:
+            logger.warning(
+                "⚠️ Asset check: %d/%d present (%d attack clips), missing: %s",
+                total - len(missing), total, len(self._attack_index), missing
+            )
+        else:
+            logger.info("🎧 Asset check: %d/%d present (%d attack clips)",
+                        total, total, len(self._attack_index))
+    
+    def _build_attack_index(self) -> Dict[Tuple[str, str], str]:
+        """
+        Build the (character, attack_name) → path dispatch table.
+        
+        Layout: {assets_dir}/characters/{character}/attacks/{attack_name}.{wav|mp3}
+        WAV is preferred over MP3 when both exist.
+        """
+        characters_dir = os.path.join(self.assets_dir, "characters")
+        index = {}
+        for path in sorted(self._asset_set):
+            rel = os.path.relpath(path, characters_dir).split(os.sep)
+            if len(rel) != 3 or rel[1] != "attacks":
+                continue
+            attack_name, ext = os.path.splitext(rel[2])
+            ext = ext.lower()
+            if ext not in (".wav", ".mp3"):
+                continue
+            key = (rel[0], attack_name)
+            if ext == ".wav" or key not in index:
+                index[key] = path
+        return index
     
     def calculate_narration_duration(self, narration_text: str) -> float:
         """
-        Estimate narration duration based on text length.
+        Estimate narration duration from an approximate phoneme count.
         
-        Average speaking rate: 150 words/min = 2.5 words/sec
-        Add 20% for dramatic pauses and emphasis.
+        Phonemes ≈ 0.4 × characters, spoken at ≈ 0.085 s/phoneme.
+        Delegates to the shared, memoized estimator in audio.duration_cache.
         
         Args:
             narration_text: Narration text
@@ -61,12 +191,7 @@ class AudioIntelligence:
         Returns:
             Estimated duration in seconds
         """
-        if not narration_text:
-            return 0.0
-        
-        word_count = len(narration_text.split())
-        base_duration = word_count / 2.5  # 150 words/min
-        return base_duration * 1.2  # Add 20% for pauses
+        return estimate_duration(narration_text)
         
     def process_audio_intent(
         self,
@@ -78,7 +203,7 @@ class AudioIntelligence:
         confidence: float,
         dialogue_intent: Optional[Dict] = None,  # Selective character dialogue
         attack_intent: Optional[Dict] = None
-    ) -> Dict:
+    ) -> "AudioDecision":
         """
         Convert Gemini audio intent → FFmpeg parameters.
         
@@ -91,49 +216,118 @@ class AudioIntelligence:
             narration_text: Optional narration text (if provided, narration will be generated)
             
         Returns:
-            {
-                "bgm_file": str or None,
-                "ambience_file": str or None,
-                "sfx_file": str or None,
-                "sfx_timestamp": float or None,
-                "intro_stinger": str or None,
-                "outro_stinger": str or None,
-                "silence_before": float,
-                "duck_bgm": bool,
-                "layer_count": int,
-                "narration_placement": str,  # "before"|"over"|"after"|"none"
-                "narration_duck_amount": float,  # 0.0-1.0
-                "missing_assets": List[str]  # For logging
-            }
+            AudioDecision with the resolved layers, timings and missing assets
         """
-        
-        missing_assets = []
-        
         # FIX #1: Relative silence timing (30% of scene, max 2s)
         silence_before = 0.0
         if audio_intent.get("use_silence", False):
             silence_before = min(2.0, scene_duration * 0.3)
         
+        camera_action = camera_timing.get("action", "static")
+        sfx_timestamp = self._calculate_sfx_timestamp(
+            camera_action,
+            camera_timing.get("duration", scene_duration)
+        )
+        attack_timestamp = self.calculate_attack_timing(camera_action, dialogue_duration)
+        
+        return self._compile_decision(
+            audio_intent, narration_text, dialogue_duration, camera_timing,
+            confidence, attack_intent, silence_before, sfx_timestamp, attack_timestamp
+        )
+    
+    def process_audio_intents_batch(self, scenes: List[Dict]) -> List["AudioDecision"]:
+        """
+        Convert a whole chapter's audio intents in one pass.
+        
+        The numeric timing rules (silence, SFX and attack offsets) are
+        evaluated as NumPy vectors across all scenes; only the asset
+        resolution runs per scene.
+        
+        Args:
+            scenes: One dict per scene with process_audio_intent() keyword arguments
+            
+        Returns:
+            AudioDecision per scene, in input order
+        """
+        if not scenes:
+            return []
+        
+        intents = [scene["audio_intent"] for scene in scenes]
+        timings = [scene["camera_timing"] for scene in scenes]
+        
+        use_silence = np.array([bool(intent.get("use_silence", False)) for intent in intents])
+        scene_duration = np.array([scene["scene_duration"] for scene in scenes], dtype=float)
+        dialogue_duration = np.round(
+            np.array([scene["dialogue_duration"] for scene in scenes], dtype=float), 3
+        )
+        camera_action = np.array([timing.get("action", "static") for timing in timings], dtype=object)
+        camera_duration = np.round(np.array([
+            timing.get("duration", scene["scene_duration"])
+            for timing, scene in zip(timings, scenes)
+        ], dtype=float), 3)
+        
+        # FIX #1: Relative silence timing (30% of scene, max 2s)
+        silence_before = np.where(use_silence, np.minimum(2.0, scene_duration * 0.3), 0.0)
+        
+        # SFX synced to camera motion; attacks land at t=0 or dialogue midpoint
+        sfx_timestamp = np.select(
+            [camera_action == action for action in _SFX_TIMING_RULES],
+            [np.broadcast_to(rule(camera_duration), camera_duration.shape) for rule in _SFX_TIMING_RULES.values()],
+            default=0.0
+        )
+        attack_timestamp = np.where(
+            np.isin(camera_action, list(_IMPACT_AT_START)), 0.0, dialogue_duration / 2.0
+        )
+        
+        return [
+            self._compile_decision(
+                scene["audio_intent"],
+                scene["narration_text"],
+                scene["dialogue_duration"],
+                scene["camera_timing"],
+                scene["confidence"],
+                scene.get("attack_intent"),
+                float(silence_before[i]),
+                float(sfx_timestamp[i]),
+                float(attack_timestamp[i])
+            )
+            for i, scene in enumerate(scenes)
+        ]
+    
+    def _compile_decision(
+        self,
+        audio_intent: Dict,
+        narration_text: str,
+        dialogue_duration: float,
+        camera_timing: Dict,
+        confidence: float,
+        attack_intent: Optional[Dict],
+        silence_before: float,
+        camera_sfx_timestamp: float,
+        camera_attack_timestamp: float
+    ) -> "AudioDecision":
+        """Resolve assets and layers for one scene from precomputed timings."""
+        missing_assets = []
+        
         # FIX #2: Silence exclusivity (silence → no ambience/bgm)
         if audio_intent.get("use_silence", False):
-            bgm_file = None
-            ambience_file = None
+            bgm_enum = ambience_enum = "none"
         else:
-            bgm_file = self.BGM_MAP.get(audio_intent.get("bgm", "none"))
-            ambience_file = self.AMBIENCE_MAP.get(audio_intent.get("ambience", "none"))
+            bgm_enum = audio_intent.get("bgm", "none")
+            ambience_enum = audio_intent.get("ambience", "none")
+        bgm_file = _BGM_MAP.get(bgm_enum)
+        ambience_file = _AMBIENCE_MAP.get(ambience_enum)
         
         # Narrator-first approach: BGM is ALWAYS ducked (0.2 volume)
         # BGM creates atmosphere, not primary audio
         duck_bgm = True  # Always duck for narrator-first approach
         
-        # Asset validation with graceful fallback
-        if bgm_file and not os.path.exists(bgm_file):
-            print(f"⚠️ Missing BGM asset: {bgm_file}")
+        # Asset validation with graceful fallback (manifest checked in __init__)
+        if bgm_file and bgm_enum not in self._available_bgm:
             missing_assets.append(bgm_file)
             bgm_file = None
             
-        if ambience_file and not os.path.exists(ambience_file):
-            print(f"⚠️ Missing ambience asset: {ambience_file}")
+        if ambience_file and ambience_enum not in self._available_ambience:
             missing_assets.append(ambience_file)
             ambience_file = None
         
@@ -142,29 +336,23 @@ class AudioIntelligence:
         sfx_timestamp = None
         if confidence >= 0.6:
             sfx_enum = audio_intent.get("impact_sfx", "none")
-            sfx_file = self.SFX_MAP.get(sfx_enum)
+            sfx_file = _SFX_MAP.get(sfx_enum)
             if sfx_file:
-                if not os.path.exists(sfx_file):
-                    print(f"⚠️ Missing SFX asset: {sfx_file}")
+                if sfx_enum not in self._available_sfx:
                     missing_assets.append(sfx_file)
                     sfx_file = None
                 else:
-                    sfx_timestamp = self._calculate_sfx_timestamp(
-                        camera_timing.get("action", "static"),
-                        camera_timing.get("duration", scene_duration)
-                    )
+                    sfx_timestamp = camera_sfx_timestamp
         
         # Stingers with validation
-        intro_stinger = self.STINGER_MAP.get("intro") if audio_intent.get("intro_stinger", False) else None
-        outro_stinger = self.STINGER_MAP.get("outro") if audio_intent.get("outro_stinger", False) else None
+        intro_stinger = _STINGER_MAP.get("intro") if audio_intent.get("intro_stinger", False) else None
+        outro_stinger = _STINGER_MAP.get("outro") if audio_intent.get("outro_stinger", False) else None
         
-        if intro_stinger and not os.path.exists(intro_stinger):
-            print(f"⚠️ Missing intro stinger: {intro_stinger}")
+        if intro_stinger and "intro" not in self._available_stingers:
             missing_assets.append(intro_stinger)
             intro_stinger = None
             
-        if outro_stinger and not os.path.exists(outro_stinger):
-            print(f"⚠️ Missing outro stinger: {outro_stinger}")
+        if outro_stinger and "outro" not in self._available_stingers:
             missing_assets.append(outro_stinger)
             outro_stinger = None
         
@@ -183,8 +371,7 @@ class AudioIntelligence:
             
             # If narration is "before", increase silence_before
             if narration_placement == "before":
-                # Estimate narration duration (rough: 150 words/min, 5 chars/word avg)
-                estimated_narration_duration = len(narration_text) / (150 * 5 / 60)
+                estimated_narration_duration = self.calculate_narration_duration(narration_text)
                 silence_before = max(silence_before, estimated_narration_duration)
         
         # Narrator-first: BGM is always ducked (handled above)
@@ -220,10 +407,6 @@ class AudioIntelligence:
                 intro_stinger = None
                 layer_count -= 1
         
-        # Logging for debugging
-        if missing_assets:
-            print(f"⚠️ Audio Intelligence: {len(missing_assets)} missing assets, continuing with available layers")
-        
         # ═══════════════════════════════════════════════════════════
         # PART 6: CHARACTER AUDIO (ATTACK + PERSONALITY)
         # ═══════════════════════════════════════════════════════════
@@ -244,53 +427,54 @@ class AudioIntelligence:
                 
                 if attack_audio:
                     # Calculate attack timing
-                    attack_timestamp = self.calculate_attack_timing(
-                        camera_timing.get("action", "static"),
-                        dialogue_duration
-                    )
+                    attack_timestamp = camera_attack_timestamp
                     layer_count += 1
-                    print(f"🎯 Attack audio: {character}/{attack_name} @ {attack_timestamp}s")
+                    logger.debug("🎯 Attack audio: %s/%s @ %ss", character, attack_name, attack_timestamp)
                 else:
                     # Fallback to generic impact SFX if attack audio missing
                     if sfx_file is None and audio_intent.get("impact_sfx", "none") != "none":
                         # Use the generic SFX that was already resolved
                         character_audio_fallback = True
-                        print(f"⚠️ Attack audio missing, using generic SFX fallback")
+                        logger.debug("⚠️ Attack audio missing, using generic SFX fallback")
                     elif sfx_file is None:
                         # No generic SFX was specified, try to use one based on attack intensity
                         intensity = attack_intent.get("intensity", "medium")
                         fallback_sfx = "punch" if intensity == "low" else "explosion" if intensity == "high" else "hit"
-                        sfx_file = self.SFX_MAP.get(fallback_sfx)
-                        if sfx_file and os.path.exists(sfx_file):
+                        sfx_file = _SFX_MAP.get(fallback_sfx)
+                        if sfx_file and fallback_sfx in self._available_sfx:
                             sfx_timestamp = self._calculate_sfx_timestamp(
                                 camera_timing.get("action", "static"),
                                 camera_timing.get("duration", dialogue_duration)
                             )
                             layer_count += 1
                             character_audio_fallback = True
-                            print(f"⚠️ Attack audio missing, using generic {fallback_sfx} SFX")
+                            logger.debug("⚠️ Attack audio missing, using generic %s SFX", fallback_sfx)
         
         # Personality is handled by narrator (no separate audio needed)
         
-        print(f"🎵 Audio Decision: {layer_count} layers | BGM: {bool(bgm_file)} | SFX: {bool(sfx_file)} | Attack: {bool(attack_audio)}")
-        
-        return {
-            "bgm_file": bgm_file,
-            "ambience_file": ambience_file,
-            "sfx_file": sfx_file,
-            "sfx_timestamp": sfx_timestamp,
-            "intro_stinger": intro_stinger,
-            "outro_stinger": outro_stinger,
-            "silence_before": silence_before,
-            "duck_bgm": duck_bgm,
-            "layer_count": layer_count,
-            "narration_placement": narration_placement,
-            "narration_duck_amount": narration_duck_amount,
-            "attack_audio": attack_audio,
-            "attack_timestamp": attack_timestamp,
-            "missing_assets": missing_assets,
-            "character_audio_fallback": character_audio_fallback
-        }
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "🎵 Audio Decision: %d layers | BGM: %s | SFX: %s | Attack: %s",
+                layer_count, bool(bgm_file), bool(sfx_file), bool(attack_audio)
+            )
+        
+        return AudioDecision(
+            bgm_file=bgm_file,
+            ambience_file=ambience_file,
+            sfx_file=sfx_file,
+            sfx_timestamp=sfx_timestamp,
+            intro_stinger=intro_stinger,
+            outro_stinger=outro_stinger,
+            silence_before=silence_before,
+            duck_bgm=duck_bgm,
+            layer_count=layer_count,
+            narration_placement=narration_placement,
+            narration_duck_amount=narration_duck_amount,
+            attack_audio=attack_audio,
+            attack_timestamp=attack_timestamp,
+            missing_assets=missing_assets,
+            character_audio_fallback=character_audio_fallback
+        )
     
     def resolve_attack_audio(self, character: str, attack_name: str) -> Optional[str]:
         """
@@ -303,14 +487,11 @@ class AudioIntelligence:
         Returns:
             Path to attack audio or None if not found
         """
-        # Try WAV first, then MP3
-        for ext in [".wav", ".mp3"]:
-            path = f"assets/characters/{character}/attacks/{attack_name}{ext}"
-            if os.path.exists(path):
-                return path
-        
-        print(f"⚠️ Attack audio not found: {character}/{attack_name}")
-        print(f"   → Narrator will describe attack by name")
+        path = self._attack_index.get((character, attack_name))
+        if path:
+            return path
+        
+        logger.debug("⚠️ Attack audio not found: %s/%s → Narrator will describe attack by name", character, attack_name)
         return None
     
     def calculate_attack_timing(self, camera_action: str, dialogue_duration: float) -> float:
@@ -328,10 +509,7 @@ class AudioIntelligence:
         Returns:
             Timestamp in seconds
         """
-        if camera_action in ["shake", "zoom_in_fast", "shake_agressive"]:
-            return 0.0
-        else:
-            return dialogue_duration / 2.0
+        return _attack_timestamp(camera_action, round(dialogue_duration, 3))
     
     def _calculate_sfx_timestamp(self, camera_action: str, camera_duration: float) -> float:
         """
@@ -344,11 +522,4 @@ class AudioIntelligence:
         - pan_left/pan_right → SFX at pan start (0.0s)
         - static → no SFX (return 0.0s as fallback)
         """
-        if camera_action == "shake":
-            return 0.0
-        elif camera_action == "zoom_in":
-            return camera_duration * 0.5
-        elif camera_action in ["zoom_out", "pan_left", "pan_right"]:
-            return 0.0
-        else:  # static
-            return 0.0
+        return _sfx_timestamp(camera_action, round(camera_duration, 3))
@@ -0,0 +1,23 @@
+# duration_cache.py - Shared Narration Duration Estimator
+from functools import lru_cache
+
+# Phoneme-rate narration model: ~0.4 phonemes per character of English
+# text, ~0.085s per phoneme for neural TTS voices
+PHONEMES_PER_CHAR = 0.4
+SECONDS_PER_PHONEME = 0.085
+
+
+@lru_cache(maxsize=8192)
+def estimate_duration(text: str) -> float:
+    """
+    Estimate spoken duration of text in seconds.
+
+    Args:
+        text: Text to be spoken
+
+    Returns:
+        Estimated duration in seconds
+    """
+    if not text:
+        return 0.0
+    return len(text) * PHONEMES_PER_CHAR * SECONDS_PER_PHONEME
@@ -1,127 +1,202 @@
 # tts_engine.py - edge-tts implementation with Audio Normalization
 import os
 import asyncio
+import logging
 import subprocess
-import edge_tts
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
 from config.config import TEMP_DIR
 
+logger = logging.getLogger("tts_engine")
+
+# Max concurrent edge-tts requests in a batch
+TTS_BATCH_CONCURRENCY = 8
+
+# Dialogue chain (extracted from audio_processing.py):
+# EQ -> Compression -> YouTube-safe loudnorm
+VOICEOVER_FILTER = ",".join([
+    "equalizer=f=80:t=h:w=100:g=3",     # Slight bass boost
+    "equalizer=f=12000:t=h:w=2000:g=2",   # Slight air
+    "acompressor=threshold=-14dB:ratio=2.5:attack=20:release=200", # Glue
+    "alimiter=limit=0.95",              # Safety ceiling
+    "loudnorm=I=-14:TP=-1.5:LRA=11"
+])
+
+# Narrator chain: Clarity + Presence + Authority; {} is the configured volume
+NARRATOR_FILTER_TEMPLATE = ",".join([
+    "highpass=f=80",                        # Remove rumble
+    "equalizer=f=200:t=h:w=100:g=2",        # Warmth
+    "equalizer=f=3000:t=h:w=1000:g=3",      # Presence/clarity
+    "acompressor=threshold=-18dB:ratio=3:attack=5:release=150",  # Smooth compression
+    "alimiter=limit=0.95",                  # Safety ceiling
+    "loudnorm=I=-16:TP=-1.5:LRA=11",
+    "volume={}"
+])
+
+# Fixed ffmpeg argv around the per-call input / filter / output
+_FFMPEG_INPUT_ARGS = ("ffmpeg", "-y", "-i")
+_FFMPEG_OUTPUT_ARGS = ("-ac", "2", "-ar", "44100")
+
 class TTSEngine:
     def __init__(self):
-        pass
+        # One event loop for the engine's lifetime instead of asyncio.run() per utterance
+        self._loop = None
+        # TEMP_DIR with trailing separator; output paths are a single concat
+        self._temp_prefix = os.path.join(TEMP_DIR, "")
 
-    async def _amake_voiceover(self, text: str, voice: str, output_path: str):
-        communicate = edge_tts.Communicate(text, voice)
-        await communicate.save(output_path)
+    def _run(self, coro):
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
 
-    def _apply_audio_processing(self, input_path: str, output_path: str):
+    async def _amake_voiceover(self, text: str, voice: str, filename: str, audio_filter: str) -> str:
         """
-        Extracted logic from audio_processing.py:
-        Removes noise, adds bass/treble boost, compression, and YouTube-safe loudnorm.
+        Streams edge-tts audio straight into ffmpeg's stdin, so synthesis and
+        post-processing happen in one pass with no intermediate raw file.
+        Falls back to writing the raw TTS audio if processing fails.
         """
-        # YouTube-safe loudness normalization filter
-        loudnorm_filter = "loudnorm=I=-14:TP=-1.5:LRA=11"
-        
-        # Audio Effects Chain: EQ -> Compression -> Normalization
-        # Optimized for narration/dialogue
-        effects = [
-            "equalizer=f=80:t=h:w=100:g=3",     # Slight bass boost
-            "equalizer=f=12000:t=h:w=2000:g=2",   # Slight air
-            "acompressor=threshold=-14dB:ratio=2.5:attack=20:release=200", # Glue
-            "alimiter=limit=0.95",              # Safety ceiling
-            loudnorm_filter
-        ]
-        
+        processed_path = self._temp_prefix + filename
+
+        # Lazy import: edge_tts pulls in aiohttp + TLS setup on import
+        import edge_tts  # Before spawning ffmpeg: an ImportError must not orphan it
+
+        proc = await asyncio.create_subprocess_exec(
+            *_FFMPEG_INPUT_ARGS, "pipe:0",
+            "-af", audio_filter,
+            *_FFMPEG_OUTPUT_ARGS,
+            processed_path,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        # Keep the raw bytes for the fallback path
+        raw_audio = bytearray()
+        try:
+            communicate = edge_tts.Communicate(text, voice)
+            async for chunk in communicate.stream():
+                if chunk["type"] != "audio":
+                    continue
+                raw_audio += chunk["data"]
+                try:
+                    proc.stdin.write(chunk["data"])
+                    await proc.stdin.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # ffmpeg exited early; reported below
+        except BaseException:
+            proc.kill()
+            await proc.wait()
+            raise
+
+        _, stderr = await proc.communicate()
+        if proc.returncode == 0:
+            return processed_path
+
+        # Fallback to raw if processing fails
+        logger.warning("⚠️ Audio processing failed: %s", stderr.decode(errors='replace')[:100])
+        raw_path = f"{self._temp_prefix}raw_{filename}"
+        with open(raw_path, 'wb') as f:
+            f.write(raw_audio)
+        return raw_path
+
+    def _spawn_processing(self, input_path: str, output_path: str, audio_filter: str) -> subprocess.Popen:
+        """Starts a file→file ffmpeg processing job without blocking."""
         cmd = [
-            "ffmpeg", "-y", "-i", input_path,
-            "-af", ",".join(effects),
-            "-ac", "2", "-ar", "44100",
+            *_FFMPEG_INPUT_ARGS, input_path,
+            "-af", audio_filter,
+            *_FFMPEG_OUTPUT_ARGS,
             output_path
         ]
-        
-        try:
-            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        return subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def process_batch(self, jobs: List[Tuple[str, str, str]]) -> List[bool]:
+        """
+        Runs file→file processing jobs concurrently, one ffmpeg worker per CPU core.
+
+        Args:
+            jobs: List of (input_path, output_path, audio_filter) tuples
+
+        Returns:
+            Success flag per job, in the same order as jobs
+        """
+        if not jobs:
+            return []
+
+        def _process(job: Tuple[str, str, str]) -> bool:
+            proc = self._spawn_processing(*job)
+            _, stderr = proc.communicate()
+            if proc.returncode != 0:
+                logger.warning("⚠️ Audio processing failed: %s", stderr.decode(errors='replace')[:100])
+                return False
             return True
-        except subprocess.CalledProcessError as e:
-            print(f"⚠️ Audio processing failed: {e.stderr.decode()[:100]}")
-            return False
+
+        workers = min(os.cpu_count() or 1, len(jobs))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_process, jobs))
 
     def generate_voiceover(self, text: str, voice: str, filename: str) -> str:
         """
         Generates VO using edge-tts and applies normalization.
         """
-        raw_path = os.path.join(TEMP_DIR, f"raw_{filename}")
-        processed_path = os.path.join(TEMP_DIR, filename)
-        
-        # 1. Generate Raw TTS
-        asyncio.run(self._amake_voiceover(text, voice, raw_path))
-        
-        # 2. Apply Normalization/Improvement
-        if self._apply_audio_processing(raw_path, processed_path):
-            if os.path.exists(raw_path):
-                os.remove(raw_path)
-            return processed_path
-        
-        # Fallback to raw if processing fails
-        return raw_path
+        return self._run(self._amake_voiceover(text, voice, filename, VOICEOVER_FILTER))
+
+    async def generate_batch(self, jobs: List[Tuple[str, str, str]]) -> List[str]:
+        """
+        Generates many voiceovers concurrently.
+
+        Args:
+            jobs: List of (text, voice, filename) tuples
+
+        Returns:
+            Output paths, in the same order as jobs
+        """
+        semaphore = asyncio.Semaphore(TTS_BATCH_CONCURRENCY)
+        audio_filter = VOICEOVER_FILTER
+
+        async def _synthesize(text: str, voice: str, filename: str) -> str:
+            async with semaphore:
+                return await self._amake_voiceover(text, voice, filename, audio_filter)
+
+        paths = await asyncio.gather(*(_synthesize(*job) for job in jobs))
+
+        # Retry streamed jobs that fell back to raw audio from the (seekable) file
+        retries = [
+            (i, path, self._temp_prefix + filename)
+            for i, (path, (_, _, filename)) in enumerate(zip(paths, jobs))
+            if path != self._temp_prefix + filename
+        ]
+        if retries:
+            results = self.process_batch([(raw, out, audio_filter) for _, raw, out in retries])
+            for (i, raw_path, processed_path), ok in zip(retries, results):
+                if ok:
+                    os.remove(raw_path)
+                    paths[i] = processed_path
+
+        return paths
+
+    def generate_voiceover_many(self, jobs: List[Tuple[str, str, str]]) -> List[str]:
+        """
+        Synchronous wrapper for generate_batch().
+        Submit a whole pipeline stage at once rather than one call per utterance.
+        """
+        if not jobs:
+            return []
+        return self._run(self.generate_batch(jobs))
 
     def generate_narration(self, text: str, filename: str) -> str:
         """
         Generates narration using configured narrator voice.
         Uses narrator-specific settings from config.
-        
+
         Args:
             text: Narration text to synthesize
             filename: Output filename (e.g., "narration_1.mp3")
-            
+
         Returns:
             Path to generated narration audio file
         """
         from config.config import NARRATOR_VOICE, NARRATOR_RATE, NARRATOR_PITCH, NARRATOR_VOLUME
-        
-        raw_path = os.path.join(TEMP_DIR, f"raw_{filename}")
-        processed_path = os.path.join(TEMP_DIR, filename)
-        
-        # 1. Generate Raw TTS with narrator voice
-        asyncio.run(self._amake_voiceover(text, NARRATOR_VOICE, raw_path))
-        
-        # 2. Apply narrator-specific audio processing
-        if self._apply_narrator_processing(raw_path, processed_path, NARRATOR_VOLUME):
-            if os.path.exists(raw_path):
-                os.remove(raw_path)
-            return processed_path
-        
-        # Fallback to raw if processing fails
-        return raw_path
-    
-    def _apply_narrator_processing(self, input_path: str, output_path: str, volume: float) -> bool:
-        """
-        Narrator-specific audio processing.
-        Optimized for clear, authoritative narration.
-        """
-        # Narrator-optimized loudness normalization
-        loudnorm_filter = "loudnorm=I=-16:TP=-1.5:LRA=11"
-        
-        # Narrator Effects Chain: Clarity + Presence + Authority
-        effects = [
-            "highpass=f=80",                        # Remove rumble
-            "equalizer=f=200:t=h:w=100:g=2",        # Warmth
-            "equalizer=f=3000:t=h:w=1000:g=3",      # Presence/clarity
-            "acompressor=threshold=-18dB:ratio=3:attack=5:release=150",  # Smooth compression
-            "alimiter=limit=0.95",                  # Safety ceiling
-            loudnorm_filter,
-            f"volume={volume}"                      # Apply configured volume
-        ]
-        
-        cmd = [
-            "ffmpeg", "-y", "-i", input_path,
-            "-af", ",".join(effects),
-            "-ac", "2", "-ar", "44100",
-            output_path
-        ]
-        
-        try:
-            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-            return True
-        except subprocess.CalledProcessError as e:
-            print(f"⚠️ Narrator audio processing failed: {e.stderr.decode()[:100]}")
-            return False
+
+        return self._run(self._amake_voiceover(
+            text, NARRATOR_VOICE, filename, NARRATOR_FILTER_TEMPLATE.format(NARRATOR_VOLUME)
+        ))
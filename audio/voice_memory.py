@@ -1,11 +1,14 @@
 # voice_memory.py - Persistent Character Voice Mapping
-import binascii
+import atexit
 import json
+import mmap
 import os
+import zlib
+import numpy as np
 from config.config import TEMP_DIR
 
 # Pool of available edge-tts voices (multi-language/tone)
-VOICE_POOL = [
+VOICE_POOL = (
     "en-US-GuyNeural",
     "en-US-JennyNeural",
     "en-GB-RyanNeural",
@@ -14,39 +17,153 @@ VOICE_POOL = [
     "en-AU-NatashaNeural",
     "en-US-ChristopherNeural",
     "en-US-MichelleNeural",
-]
+)
+_VOICE_INDEX = {voice: i for i, voice in enumerate(VOICE_POOL)}
+
+# Packed table row: CRC32(name) → index into VOICE_POOL, 5 bytes, sorted by hash
+TABLE_DTYPE = np.dtype([('h', '<u4'), ('v', 'u1')])
+
+# Side-log entries folded into the table on flush once this many accumulate
+COMPACT_THRESHOLD = 64
+
+
+def _name_hash(name: str) -> int:
+    return zlib.crc32(name.encode('utf-8'))
+
 
 class VoiceMemory:
     def __init__(self, storage_path=None):
         if storage_path is None:
             storage_path = os.path.join(TEMP_DIR, "voice_memory.json")
+        # JSONL side-log of assignments made since the last compaction
         self.storage_path = storage_path
+        self.table_path = os.path.splitext(storage_path)[0] + ".bin"
+        self._needs_rewrite = False
+        self._mmap = None
+        self._table = np.empty(0, dtype=TABLE_DTYPE)
+        self._open_table()
         self.memory = self._load_memory()
+        # Assignments made since the last flush (dirty set)
+        self._pending = {}
+        # Raw (un-normalized) name → voice, for repeat lookups within a run
+        self._resolved = {}
+        atexit.register(self.flush)
+
+    def _open_table(self):
+        """Maps the packed table read-only; no parsing happens at startup."""
+        try:
+            with open(self.table_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < TABLE_DTYPE.itemsize:
+                    return
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError:
+            return
+        rows = len(self._mmap) // TABLE_DTYPE.itemsize
+        self._table = np.frombuffer(self._mmap, dtype=TABLE_DTYPE, count=rows)
+
+    def _close_table(self):
+        # Drop the array view before closing, or mmap refuses (exported buffer)
+        self._table = np.empty(0, dtype=TABLE_DTYPE)
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
 
     def _load_memory(self):
-        if os.path.exists(self.storage_path):
-            with open(self.storage_path, 'r') as f:
-                return json.load(f)
-        return {}
+        """
+        The side-log is append-only JSONL: one {"name": "voice"} object per line.
+        The legacy single indented JSON object is still accepted and is
+        compacted into the table on the next flush.
+        """
+        if not os.path.exists(self.storage_path):
+            return {}
+        with open(self.storage_path, 'r') as f:
+            text = f.read()
+        if not text.strip():
+            return {}
 
-    def _save_memory(self):
+        # Whole file first: the legacy object may span lines and end in a newline
+        try:
+            memory = json.loads(text)
+            self._needs_rewrite = True
+            return memory
+        except ValueError:
+            pass
+
+        memory = {}
+        for line in text.splitlines():
+            if line.strip():
+                memory.update(json.loads(line))
+        return memory
+
+    def _lookup_table(self, name_hash: int):
+        """Binary search of the mapped table; None if the hash is absent."""
+        hashes = self._table['h']
+        i = np.searchsorted(hashes, name_hash)
+        if i < len(hashes) and hashes[i] == name_hash:
+            return VOICE_POOL[self._table['v'][i]]
+        return None
+
+    def _compact(self):
+        """
+        Folds the side-log into the sorted table and truncates the log.
+        Voices outside VOICE_POOL cannot be packed and stay in the log.
+        """
+        rows = {int(h): int(v) for h, v in zip(self._table['h'], self._table['v'])}
+        leftover = {}
+        for name, voice in self.memory.items():
+            index = _VOICE_INDEX.get(voice)
+            if index is None:
+                leftover[name] = voice
+            else:
+                rows[_name_hash(name)] = index
+
+        table = np.array(sorted(rows.items()), dtype=TABLE_DTYPE)
+        temp = self.table_path + ".tmp"
+        table.tofile(temp)
+        # Windows cannot replace a file that is still mapped
+        self._close_table()
+        os.replace(temp, self.table_path)
+        self._open_table()
+
+        self.memory = leftover
         with open(self.storage_path, 'w') as f:
-            json.dump(self.memory, f, indent=4)
+            for name, voice in leftover.items():
+                f.write(json.dumps({name: voice}, separators=(",", ":")) + "\n")
+        self._needs_rewrite = False
+
+    def flush(self):
+        """Persists new assignments; O(1) append, periodic compaction."""
+        if not self._pending and not self._needs_rewrite:
+            return
+        if self._needs_rewrite or len(self.memory) >= COMPACT_THRESHOLD:
+            self._compact()
+        else:
+            with open(self.storage_path, 'a') as f:
+                for name, voice in self._pending.items():
+                    f.write(json.dumps({name: voice}, separators=(",", ":")) + "\n")
+        self._pending.clear()
 
     def get_voice(self, character_name: str) -> str:
         """
         Retrieves or assigns a deterministic voice for a character.
         Assignment is based on CRC32(character_name) % len(VOICE_POOL).
+        New assignments are persisted on flush().
         """
-        character_name = character_name.lower().strip()
-        if character_name in self.memory:
-            return self.memory[character_name]
+        resolved = self._resolved.get(character_name)
+        if resolved is not None:
+            return resolved
+
+        name = character_name.lower().strip()
+        assigned_voice = self.memory.get(name)
+        if assigned_voice is None:
+            name_hash = _name_hash(name)
+            assigned_voice = self._lookup_table(name_hash)
+            if assigned_voice is None:
+                # Deterministic assignment (same values as the previous binascii.crc32)
+                assigned_voice = VOICE_POOL[name_hash % len(VOICE_POOL)]
 
-        # Deterministic assignment
-        crc = binascii.crc32(character_name.encode('utf-8')) & 0xffffffff
-        voice_index = crc % len(VOICE_POOL)
-        assigned_voice = VOICE_POOL[voice_index]
+                self.memory[name] = assigned_voice
+                self._pending[name] = assigned_voice
 
-        self.memory[character_name] = assigned_voice
-        self._save_memory()
+        self._resolved[character_name] = assigned_voice
         return assigned_voice
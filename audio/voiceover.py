@@ -1,7 +1,6 @@
 # voiceover.py - edge-tts implementation
 import os
 import asyncio
-import edge_tts
 from config import TEMP_DIR
 
 class VoiceoverEngine:
@@ -9,6 +8,7 @@ class VoiceoverEngine:
         pass
 
     async def _amake_voiceover(self, text: str, voice: str, output_path: str):
+        import edge_tts  # Lazy: heavy import (aiohttp, TLS setup)
         communicate = edge_tts.Communicate(text, voice)
         await communicate.save(output_path)
 
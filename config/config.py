@@ -20,13 +20,17 @@ for d in [TEMP_DIR, OUTPUT_DIR, DOWNLOAD_DIR, MODELS_DIR]:
 FPS = int(os.getenv("BOT_FPS", 24))
 WIDTH = int(os.getenv("WIDTH", 1920))
 HEIGHT = int(os.getenv("HEIGHT", 1080))
+VIDEO_ENCODER = os.getenv("VIDEO_ENCODER", "auto").lower()  # auto | h264_nvenc | h264_videotoolbox | libx264
+VIDEO_HWSCALE = os.getenv("VIDEO_HWSCALE", "auto").lower()  # auto | cuda | none
 
 # ==================== AI & REASONING ====================
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", 60))  # Client-side request pacing
 
 # ==================== COMIC SPECIFIC ====================
 PANEL_CONFIDENCE_THRESHOLD = float(os.getenv("PANEL_CONFIDENCE_THRESHOLD", 0.5))
+PANEL_ROW_HEIGHT = int(os.getenv("PANEL_ROW_HEIGHT", 50))  # Reading-order row band (px)
 OCR_LANGUAGES = ['en']
 VOICE_MEMORY_PATH = os.path.join(TEMP_DIR, "voice_memory.json")
 MUSIC_VOLUME = float(os.getenv("MUSIC_VOLUME", 0.15))
@@ -38,6 +42,9 @@ FFPROBE_BIN = os.getenv("FFPROBE_BIN", "ffprobe")
 # GPU Settings
 USE_GPU = os.getenv("GPU_MODE", "auto").lower() != "off"
 
+# Logging: VERBOSE=true enables per-scene debug output
+VERBOSE = os.getenv("VERBOSE", "false").lower() == "true"
+
 # ==================== NARRATION SETTINGS ====================
 NARRATOR_ENABLED = os.getenv("NARRATOR_ENABLED", "true").lower() == "true"
 NARRATOR_VOICE = os.getenv("NARRATOR_VOICE", "en-US-GuyNeural")
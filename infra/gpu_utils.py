@@ -42,22 +42,45 @@ def clear_gpu_cache():
     gc.collect()
     logger.info("🗑️ GPU memory cleared.")
 
+# Free VRAM below which the OOM retry waits briefly for the allocator to settle
+OOM_LOW_FREE_MB = 100
+OOM_SETTLE_SECONDS = 0.5
+
+def _is_oom(e: Exception) -> bool:
+    """True if e is a CUDA out-of-memory error."""
+    t = get_torch()
+    oom_type = getattr(t.cuda, "OutOfMemoryError", None) if t else None
+    if oom_type is not None:
+        return isinstance(e, oom_type)
+    # torch < 1.13 raises a plain RuntimeError
+    return isinstance(e, RuntimeError) and "out of memory" in str(e).lower()
+
+def _recover_from_oom():
+    """Clears the cache; only sleeps if memory is still not released."""
+    clear_gpu_cache()
+    t = get_torch()
+    if t and t.cuda.is_available():
+        t.cuda.synchronize()
+        if get_gpu_status()["free_mb"] < OOM_LOW_FREE_MB:
+            time.sleep(OOM_SETTLE_SECONDS)
+
 def run_with_gpu_guard(func, *args, **kwargs):
     """
     Runs a function with GPU memory clearing and OOM protection.
     Used for OCR and Panel Detection.
+    OOMs are mostly deterministic, so a single retry after clearing is attempted.
     """
-    max_retries = 2
-    for attempt in range(max_retries + 1):
-        try:
-            return func(*args, **kwargs)
-        except Exception as e:
-            if "out of memory" in str(e).lower():
-                logger.warning(f"⚠️ GPU OOM detected (Attempt {attempt+1}). Clearing cache...")
-                clear_gpu_cache()
-                if attempt == max_retries:
-                    logger.error("❌ GPU OOM persistent after retries.")
-                    raise e
-                time.sleep(2)
-            else:
-                raise e
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        if not _is_oom(e):
+            raise
+        logger.warning("⚠️ GPU OOM detected. Clearing cache and retrying once...")
+        _recover_from_oom()
+
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        if _is_oom(e):
+            logger.error("❌ GPU OOM persistent after retry.")
+        raise
@@ -0,0 +1,37 @@
+# rate_limiter.py - Client-side Token Bucket for Rate-Limited APIs
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Paces calls to at most refill_per_sec on average, with bursts up to capacity.
+    Callers block in acquire() instead of being rejected by the server.
+    """
+
+    def __init__(self, capacity: float, refill_per_sec: float):
+        self.capacity = capacity
+        self.refill_rate = refill_per_sec
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """Takes one token, sleeping until one is available."""
+        with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                time.sleep((1 - self.tokens) / self.refill_rate)
+                self._refill()
+            self.tokens -= 1
+
+    def penalize(self):
+        """Server said slow down (HTTP 429): drain at least one refill period."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens - self.refill_rate, -1)
@@ -1,5 +1,6 @@
 # downloader.py - Mature Manga/Comic Input & yt-dlp Processor
 import os
+import atexit
 import logging
 import yt_dlp
 import glob
@@ -8,9 +9,17 @@ from datetime import datetime
 import re
 import json
 import hashlib
+try:
+    import xxhash
+    _file_hasher = xxhash.xxh3_64
+except ImportError:
+    # hashlib.sha1 uses SHA-NI where the CPU has it (Intel Ice Lake+, AMD Zen)
+    _file_hasher = hashlib.sha1
 import shutil
 import requests
 import subprocess
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, Optional, List
 from processing.pdf_processor import process_pdf
 from config.config import TEMP_DIR, DOWNLOAD_DIR
@@ -21,32 +30,63 @@ os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 # Configuration & Constants
 DOWNLOAD_RETRY_DELAY = int(os.getenv("DOWNLOAD_RETRY_DELAY", 2))
 RATE_LIMIT_WAIT = int(os.getenv("RATE_LIMIT_WAIT", 8))
+DOWNLOAD_BUFFER_SIZE = 1 << 20
+FILE_HASH_CHUNK_SIZE = 1 << 20
+
+# Shared session: pooled connections keep TCP/TLS state across downloads
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
 
 def _calculate_file_hash(path: str) -> str:
-    """Calculate SHA1 hash of file for uniqueness."""
+    """Calculate a fast non-cryptographic hash (xxh3-64) of file for uniqueness."""
     try:
-        sha1 = hashlib.sha1()
+        hasher = _file_hasher()
         with open(path, 'rb') as f:
             while True:
-                data = f.read(65536)
+                data = f.read(FILE_HASH_CHUNK_SIZE)
                 if not data: break
-                sha1.update(data)
-        return sha1.hexdigest()[:8]
+                hasher.update(data)
+        return hasher.hexdigest()[:8]
     except:
         return ""
 
 class DownloadIndex:
-    """Persistent, lightweight index for O(1) duplicate lookups."""
+    """
+    Persistent, lightweight index for O(1) duplicate lookups.
+    Held in memory after the first access; registrations are appended to a
+    line-JSON WAL and folded into index.json at exit.
+    """
     INDEX_FILE = os.path.join(DOWNLOAD_DIR, "index.json")
+    WAL_FILE = os.path.join(DOWNLOAD_DIR, "index.wal")
+    _cache: Optional[Dict] = None
     
     @classmethod
     def _load_index(cls) -> Dict:
+        if cls._cache is not None:
+            return cls._cache
+        data = {"ids": {}, "hashes": {}}
         try:
             if os.path.exists(cls.INDEX_FILE):
                 with open(cls.INDEX_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    data = json.load(f)
         except: pass
-        return {"ids": {}, "hashes": {}}
+        # Replay registrations not yet folded into index.json (e.g. after a crash)
+        try:
+            if os.path.exists(cls.WAL_FILE):
+                with open(cls.WAL_FILE, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        for section, entries in json.loads(line).items():
+                            data.setdefault(section, {}).update(entries)
+        except: pass
+        cls._cache = data
+        atexit.register(cls._flush)
+        return data
 
     @classmethod
     def _save_index(cls, data: Dict):
@@ -54,16 +94,36 @@ class DownloadIndex:
         try:
             with open(temp, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=0)
-            if os.path.exists(cls.INDEX_FILE): os.remove(cls.INDEX_FILE)
-            os.rename(temp, cls.INDEX_FILE)
-        except: pass
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, cls.INDEX_FILE)
+            return True
+        except:
+            return False
+
+    @classmethod
+    def _flush(cls):
+        """Rewrites index.json once and truncates the WAL."""
+        if cls._cache is None or not os.path.exists(cls.WAL_FILE):
+            return
+        if cls._save_index(cls._cache):
+            os.remove(cls.WAL_FILE)
 
     @classmethod
     def register(cls, path: str, url_id: str = None, c_hash: str = None):
         data = cls._load_index()
-        if url_id: data["ids"][str(url_id)] = path
-        if c_hash: data["hashes"][c_hash] = path
-        cls._save_index(data)
+        entry = {}
+        if url_id:
+            data["ids"][str(url_id)] = path
+            entry["ids"] = {str(url_id): path}
+        if c_hash:
+            data["hashes"][c_hash] = path
+            entry["hashes"] = {c_hash: path}
+        if not entry: return
+        try:
+            with open(cls.WAL_FILE, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + "\n")
+        except: pass
 
     @classmethod
     def find_by_id(cls, url_id: str) -> Optional[str]:
@@ -89,11 +149,27 @@ def process_manga_input(input_path: str) -> List[str]:
         filename = f"manga_{int(time.time())}.{ext}"
         path = os.path.join(DOWNLOAD_DIR, filename)
         
+        complete = False
         try:
-            response = requests.get(input_path, stream=True, timeout=30)
+            response = _SESSION.get(input_path, stream=True, timeout=30)
             if response.status_code == 200:
-                with open(path, 'wb') as f:
-                    for chunk in response.iter_content(1024): f.write(chunk)
+                expected_size = None
+                with open(path, 'wb', buffering=DOWNLOAD_BUFFER_SIZE) as f:
+                    # Preallocate only when the body length is the on-disk length
+                    content_length = response.headers.get("Content-Length")
+                    if content_length and not response.headers.get("Content-Encoding"):
+                        expected_size = int(content_length)
+                        f.truncate(expected_size)
+                    response.raw.decode_content = True
+                    shutil.copyfileobj(response.raw, f, length=DOWNLOAD_BUFFER_SIZE)
+                    written = f.tell()
+                
+                # A short body would leave the preallocated tail as zero padding
+                if expected_size is not None and written != expected_size:
+                    os.remove(path)
+                    print(f"❌ Download incomplete: {written}/{expected_size} bytes")
+                    return []
+                complete = True
                 
                 # Register in index
                 DownloadIndex.register(path, url_id=input_path)
@@ -103,6 +179,8 @@ def process_manga_input(input_path: str) -> List[str]:
                 return [path]
         except Exception as e:
             print(f"❌ Download failed: {e}")
+            if not complete and os.path.exists(path):
+                os.remove(path)  # Partial (possibly zero-padded) file
             return []
 
     # 2. Handle PDF
@@ -1,18 +1,76 @@
 # intelligence/comic_brain.py - Professional Manga Animation Director AI
 import os
 import json
+import re
+import atexit
+import hashlib
+from concurrent.futures import Future, ThreadPoolExecutor
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from typing import Dict, Optional, List
-from config.config import GEMINI_API_KEY, GEMINI_MODEL
+from config.config import BASE_DIR, GEMINI_API_KEY, GEMINI_MODEL, GEMINI_RPM
+from infra.rate_limiter import TokenBucket
+from processing.scene_grouper import dhash_file
+
+# Persisted across runs: Gemini responses and the character dictionary
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
+SCENE_CACHE_PATH = os.path.join(CACHE_DIR, "comic_brain.json")
+CHARACTERS_PATH = os.path.join(CACHE_DIR, "characters.json")
+SCENE_CACHE_FLUSH_EVERY = 5
+
+_FENCED_JSON = re.compile(r"```(?:json)?\s*(\{.*\})\s*```", re.DOTALL)
+
+# Textless panel within this many dHash bits of the previous one → silent scene, no API call
+SILENT_SCENE_MAX_DISTANCE = 8
+
+def _hash_image(path: str) -> str:
+    """SHA1 of the image content, streamed in 64KB blocks."""
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def _load_json(path: str) -> Dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_json(path: str, data: Dict):
+    """Atomic write: tmp file + rename."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temp = path + ".tmp"
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(temp, path)
 
 class ComicBrain:
     def __init__(self):
         if not GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY not found in environment.")
         genai.configure(api_key=GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(GEMINI_MODEL)
-        self.character_memory = {}  # Persistent character knowledge
+        # JSON mode: the SDK returns the bare object, no markdown fences to strip
+        self.model = genai.GenerativeModel(
+            GEMINI_MODEL, generation_config={"response_mime_type": "application/json"}
+        )
+        self.character_memory = _load_json(CHARACTERS_PATH)  # Persistent character knowledge
         self.previous_scene_summary = None  # Continuity tracking
+        # Self-pace to the per-minute quota instead of hitting 429s
+        self.bucket = TokenBucket(capacity=GEMINI_RPM, refill_per_sec=GEMINI_RPM / 60)
+        # (image SHA1, OCR text + previous scene SHA1) -> parsed Gemini response
+        self._scene_cache = _load_json(SCENE_CACHE_PATH)
+        self._cached_images = {key.split(":", 1)[0] for key in self._scene_cache}
+        self._unsaved_scenes = 0
+        atexit.register(self.save_cache)
+        # Previous scene's reference panel hash and BGM, for silent-scene short-circuit
+        self._last_dhash = None
+        self._last_bgm = "none"
+        # Image SHA1 -> upload future; background uploads overlap the previous scene's generation
+        self._uploads: Dict[str, Future] = {}
+        self._upload_pool = ThreadPoolExecutor(max_workers=2)
+        self._image_hashes: Dict[str, str] = {}
         
     def analyze_scene(self, image_path: str, ocr_text: str, scene_index: int = 0) -> Dict:
         """
@@ -205,27 +263,34 @@ Same input → Same output.
 """
         
         try:
-            # Upload image to Gemini
-            sample_file = genai.upload_file(path=image_path, display_name=f"Scene_{scene_index}")
-            
-            response = self.model.generate_content([prompt, sample_file])
-            
-            # Clean response text
-            text = response.text.strip()
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0].strip()
-                
-            result = json.loads(text)
+            result = self._silent_scene_result(image_path, ocr_text)
+            if result is None:
+                # Same image + same OCR text + same previous scene → same answer. The persisted
+                # character dictionary is left out: it grows between runs and would miss every rerun
+                image_hash = self._image_hash(image_path)
+                context = f"{ocr_text}\0{prev_summary}".encode('utf-8')
+                cache_key = f"{image_hash}:{hashlib.sha1(context).hexdigest()}"
+                result = self._scene_cache.get(cache_key)
+                if result is None:
+                    result = self._request_analysis(image_path, image_hash, prompt, scene_index)
+                    self._scene_cache[cache_key] = result
+                    self._cached_images.add(image_hash)
+                    self._unsaved_scenes += 1
+                    if self._unsaved_scenes >= SCENE_CACHE_FLUSH_EVERY:
+                        self.save_cache()
+                self._last_bgm = (result.get("audio") or {}).get("bgm", "none")
             
             # Update character memory with new characters
+            new_characters = False
             for char in result.get("characters", []):
                 if char.get("is_new") and char["name"] not in self.character_memory:
                     self.character_memory[char["name"]] = {
                         "first_seen": scene_index,
                         "baseline": char.get("emotion", "neutral")
                     }
+                    new_characters = True
+            if new_characters:
+                _save_json(CHARACTERS_PATH, self.character_memory)
             
             # Update continuity
             self.previous_scene_summary = result.get("scene_summary", "")
@@ -253,6 +318,93 @@ Same input → Same output.
                 "_raw_director_output": None
             }
     
+    def _silent_scene_result(self, image_path: str, ocr_text: str) -> Optional[Dict]:
+        """
+        A textless panel that looks like the previous scene's is a silent
+        continuation (the prompt's own is_silent rule), so skip Gemini.
+        """
+        panel_hash = dhash_file(image_path)
+        last_hash, self._last_dhash = self._last_dhash, panel_hash
+        if ocr_text.strip() or panel_hash is None or last_hash is None:
+            return None
+        if bin(panel_hash ^ last_hash).count("1") >= SILENT_SCENE_MAX_DISTANCE:
+            return None
+        return {
+            "scene_summary": self.previous_scene_summary or "",
+            "confidence": 0.5,
+            "is_silent": True,
+            "narration": "",
+            "characters": [],
+            "camera": {"action": "static", "intensity": "low"},
+            "audio": {
+                "bgm": self._last_bgm,
+                "ambience": "none",
+                "impact_sfx": "none",
+                "use_silence": False,
+                "duck_bgm": True,
+                "intro_stinger": False,
+                "outro_stinger": False
+            }
+        }
+    
+    def _image_hash(self, image_path: str) -> str:
+        image_hash = self._image_hashes.get(image_path)
+        if image_hash is None:
+            image_hash = self._image_hashes[image_path] = _hash_image(image_path)
+        return image_hash
+
+    def _upload(self, image_path: str, image_hash: str, scene_index: int) -> Future:
+        """Uploads each distinct image once; later scenes reuse the file handle."""
+        future = self._uploads.get(image_hash)
+        if future is None:
+            future = self._upload_pool.submit(
+                genai.upload_file, path=image_path, display_name=f"Scene_{scene_index}"
+            )
+            self._uploads[image_hash] = future
+        return future
+
+    def prefetch_upload(self, image_path: str, scene_index: int):
+        """Starts uploading a panel in the background ahead of its analyze_scene call."""
+        try:
+            image_hash = self._image_hash(image_path)
+        except OSError:
+            return
+        # Already answered from the response cache in an earlier run: no upload needed
+        if image_hash not in self._cached_images:
+            self._upload(image_path, image_hash, scene_index)
+
+    def _request_analysis(self, image_path: str, image_hash: str, prompt: str, scene_index: int) -> Dict:
+        """Uploads the panel (or reuses its upload) and parses Gemini's JSON reply."""
+        upload = self._upload(image_path, image_hash, scene_index)
+        try:
+            sample_file = upload.result()
+        except Exception:
+            self._uploads.pop(image_hash, None)  # Retry the upload next time
+            raise
+        
+        self.bucket.acquire()
+        try:
+            response = self.model.generate_content([prompt, sample_file])
+        except google_exceptions.ResourceExhausted:
+            self.bucket.penalize()
+            raise
+        
+        text = response.text
+        try:
+            return json.loads(text)
+        except ValueError:
+            # Fallback: JSON wrapped in a markdown fence
+            match = _FENCED_JSON.search(text)
+            if match is None:
+                raise
+            return json.loads(match.group(1))
+    
+    def save_cache(self):
+        """Persists new Gemini responses to cache/comic_brain.json."""
+        if self._unsaved_scenes:
+            _save_json(SCENE_CACHE_PATH, self._scene_cache)
+            self._unsaved_scenes = 0
+    
     def reset_memory(self):
         """Reset character memory for new chapter."""
         self.character_memory = {}
@@ -1,20 +1,25 @@
 # main_pipeline.py - Comic/Manga Automation Orchestrator (INFRASTRUCTURE AWARE)
 import os
+import logging
 import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from infra import gpu_utils
-from config.config import TEMP_DIR, OUTPUT_DIR
+from config.config import TEMP_DIR, OUTPUT_DIR, VERBOSE
 from input.downloader import process_manga_input
-from processing.panel_detector import PanelDetector
+from processing.panel_detector import PanelDetector, _init_detector_worker, _detect_page
 from processing.scene_grouper import SceneGrouper
 from processing.ocr_engine import OCREngine
 from intelligence.comic_brain import ComicBrain
 from audio.voice_memory import VoiceMemory
 from audio.tts_engine import TTSEngine
-from video.animation_engine import generate_animation_command
 from processing.pdf_processor import process_pdf
 
+# Scene ffmpeg jobs running at once in the per-scene (fallback) render pass
+SCENE_RENDER_CONCURRENCY = 3
+
 class ComicAutomationPipeline:
     def __init__(self):
+        logging.basicConfig(level=logging.DEBUG if VERBOSE else logging.INFO, format="%(message)s")
         self.detector = PanelDetector()
         self.grouper = SceneGrouper()
         self.ocr = OCREngine()
@@ -36,16 +41,16 @@ class ComicAutomationPipeline:
             print("❌ No pages found to process.")
             return
 
-        # 2. Page & Panel Processing (with GPU Guard)
-        all_panels = []
-        for i, page_path in enumerate(page_paths):
-            print(f"🔍 Detecting panels on page {i+1}/{len(page_paths)}...")
-            panels = gpu_utils.run_with_gpu_guard(
-                self.detector.extract_and_save_panels, 
-                page_path, 
-                f"page_{i}"
-            )
-            all_panels.extend(panels)
+        # 2. Page & Panel Processing (CPU-only OpenCV, one process per core)
+        page_panels = [None] * len(page_paths)
+        workers = min(os.cpu_count() or 1, len(page_paths))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_detector_worker) as pool:
+            futures = [pool.submit(_detect_page, (i, page_path)) for i, page_path in enumerate(page_paths)]
+            for done, future in enumerate(as_completed(futures), 1):
+                i, panels = future.result()
+                page_panels[i] = panels
+                print(f"🔍 Detected panels on page {i+1} ({done}/{len(page_paths)})")
+        all_panels = [panel for panels in page_panels for panel in panels]
             
         # 3. Grouping
         scenes = self.grouper.group_panels(all_panels)
@@ -54,104 +59,123 @@ class ComicAutomationPipeline:
         # Initialize audio intelligence
         from audio.audio_intelligence import AudioIntelligence
         from video.animation_engine import get_camera_timing
-        from video.composer import mix_scene_audio
+        from video.composer import render_scene
         audio_intelligence = AudioIntelligence()
         
-        scene_clips = []
-        for i, scene in enumerate(scenes):
-            print(f"🎥 Processing Scene {i+1}/{len(scenes)}...")
-            
-            # 4. OCR (GPU Guarded)
-            scene_text = ""
-            for panel_path in scene:
-                text = gpu_utils.run_with_gpu_guard(self.ocr.get_full_text, panel_path)
-                scene_text += text + " "
-            
-            # 5. Reasoning (with continuity tracking)
-            ref_panel = scene[len(scene)//2]
-            scene_analysis = self.brain.analyze_scene(ref_panel, scene_text, scene_index=i)
-            
-            # 6. Audio - Generate dialogue voiceover
-            voice = self.voice_memory.get_voice(scene_analysis['character_name'])
-            audio_path = self.tts.generate_voiceover(
-                scene_analysis['voiceover_script'],
-                voice,
-                f"scene_{i}_audio.mp3"
-            )
-            
-            # Get audio duration for timing calculations
-            from video.animation_engine import get_audio_duration
-            audio_duration = get_audio_duration(audio_path)
-            
-            # 7. Animation (FFmpeg) - Create base video clip
-            clip_path = os.path.join(TEMP_DIR, f"scene_{i}_clip.mp4")
-            anim_cmd = generate_animation_command(
-                ref_panel,
-                audio_path,
-                clip_path,
-                emotion=scene_analysis['emotion']
-            )
-            
-            print(f"📽️ Animating scene {i+1}...")
-            subprocess.run(anim_cmd, check=True)
-            
-            
-            # 8. Auto-create character folders for new characters
-            from utils.character_manager import CharacterAssetManager
-            char_manager = CharacterAssetManager()
-            
-            raw_output = scene_analysis.get("_raw_director_output", {})
-            characters = raw_output.get("characters", [])
-            for char in characters:
-                if char.get("is_new"):
-                    char_manager.ensure_character_folders(char.get("name", ""))
-            
-            # 9. Extract narration (PRIMARY AUDIO)
-            narration_text = raw_output.get("narration", "")
-            
-            # 10. Extract character dialogue (SELECTIVE - iconic moments only)
-            dialogue_intent = raw_output.get("character_dialogue", {})
-            
-            # 11. Audio Intelligence - Process audio intent
-            audio_intent = raw_output.get("audio", {})
-            attack_intent = raw_output.get("attack", {})
-            personality_intent = raw_output.get("personality_cue", {})
-            
-            # Get camera timing for SFX synchronization
-            camera_timing = get_camera_timing(
-                scene_analysis['emotion'],
-                audio_duration
-            )
-            
-            # Process audio intent to get mixing parameters (narrator-first)
-            audio_params = audio_intelligence.process_audio_intent(
-                audio_intent=audio_intent,
-                narration_text=narration_text,  # Required for narrator-first
-                dialogue_duration=audio_duration,
-                camera_timing=camera_timing,
-                scene_duration=audio_duration,
-                confidence=scene_analysis['confidence_score'],
-                dialogue_intent=dialogue_intent,  # Selective character dialogue
-                attack_intent=attack_intent
-            )
-            
-            # 9. Audio Mixing - Mix all audio layers
-            final_clip_path = os.path.join(TEMP_DIR, f"scene_{i}_final.mp4")
-            mixed_clip = mix_scene_audio(
-                video_path=clip_path,
-                dialogue_path=audio_path,
-                audio_params=audio_params,
-                output_path=final_clip_path
+        # Pass 1: OCR + reasoning per scene; voiceover jobs are collected
+        # so TTS can be submitted as a single batch afterwards
+        from utils.character_manager import CharacterAssetManager
+        char_manager = CharacterAssetManager()
+        
+        # 4. OCR (GPU Guarded) - one batched pass per scene on a background thread,
+        # so the next scenes are read while the current one is with Gemini
+        ocr_pool = ThreadPoolExecutor(max_workers=1)
+        ocr_futures = [
+            ocr_pool.submit(gpu_utils.run_with_gpu_guard, self.ocr.get_full_text_batch, scene)
+            for scene in scenes
+        ]
+        
+        analyses = []
+        tts_jobs = []
+        try:
+            for i, scene in enumerate(scenes):
+                print(f"🎥 Analyzing Scene {i+1}/{len(scenes)}...")
+                
+                scene_text = "".join(text + " " for text in ocr_futures[i].result())
+                
+                # 5. Reasoning (with continuity tracking); next panel uploads meanwhile
+                ref_panel = scene[len(scene)//2]
+                if i + 1 < len(scenes):
+                    next_scene = scenes[i + 1]
+                    self.brain.prefetch_upload(next_scene[len(next_scene)//2], i + 1)
+                scene_analysis = self.brain.analyze_scene(ref_panel, scene_text, scene_index=i)
+                analyses.append((ref_panel, scene_analysis))
+                
+                # 6. Audio - Queue dialogue voiceover
+                voice = self.voice_memory.get_voice(scene_analysis['character_name'])
+                tts_jobs.append((scene_analysis['voiceover_script'], voice, f"scene_{i}_audio.mp3"))
+                
+                # 8. Auto-create character folders for new characters
+                raw_output = scene_analysis.get("_raw_director_output") or {}
+                char_manager.ensure_all_character_folders([
+                    char.get("name", "") for char in raw_output.get("characters", [])
+                    if char.get("is_new")
+                ])
+                
+                # Periodically clear GPU cache to prevent fragmentation
+                if i % 5 == 0:
+                    gpu_utils.clear_gpu_cache()
+        finally:
+            # On an error, drop the queued OCR jobs instead of finishing them on the GPU
+            ocr_pool.shutdown(cancel_futures=True)
+        
+        self.voice_memory.flush()
+        
+        # 6. Audio - Generate all dialogue voiceovers in one batch
+        print(f"🎙️ Generating {len(tts_jobs)} voiceovers...")
+        audio_paths = self.tts.generate_voiceover_many(tts_jobs)
+        
+        # Get audio durations for timing calculations
+        from video.animation_engine import get_audio_duration
+        audio_durations = [get_audio_duration(audio_path) for audio_path in audio_paths]
+        
+        # 11. Audio Intelligence - Process the whole chapter's audio intent in one pass
+        audio_scenes = []
+        for (ref_panel, scene_analysis), audio_duration in zip(analyses, audio_durations):
+            raw_output = scene_analysis.get("_raw_director_output") or {}
+            audio_scenes.append({
+                "audio_intent": raw_output.get("audio", {}),
+                # 9. Narration (PRIMARY AUDIO) - required for narrator-first
+                "narration_text": raw_output.get("narration", ""),
+                "dialogue_duration": audio_duration,
+                # Camera timing for SFX synchronization
+                "camera_timing": get_camera_timing(scene_analysis['emotion'], audio_duration),
+                "scene_duration": audio_duration,
+                "confidence": scene_analysis['confidence_score'],
+                # 10. Character dialogue (SELECTIVE - iconic moments only)
+                "dialogue_intent": raw_output.get("character_dialogue", {}),
+                "attack_intent": raw_output.get("attack", {})
+            })
+        all_audio_params = audio_intelligence.process_audio_intents_batch(audio_scenes)
+        
+        # Pass 2: Animation + audio mixing + composition, the whole chapter in one ffmpeg job
+        from video.composer import SceneSpec, ClipJoiner, render_chapter, finalize_video
+        scene_specs = [
+            SceneSpec(ref_panel, audio_path, audio_params,
+                      emotion=scene_analysis['emotion'], duration=audio_duration)
+            for (ref_panel, scene_analysis), audio_path, audio_duration, audio_params in zip(
+                analyses, audio_paths, audio_durations, all_audio_params
             )
-            
-            scene_clips.append(mixed_clip)
-            
-            # Periodically clear GPU cache to prevent fragmentation
-            if i % 5 == 0:
-                gpu_utils.clear_gpu_cache()
-            
+        ]
+        raw_video = os.path.join(TEMP_DIR, f"raw_{output_filename}")
+        try:
+            render_chapter(scene_specs, raw_video)
+        except subprocess.CalledProcessError as e:
+            # Fall back to one job per scene, streamed into one joining ffmpeg
+            print(f"⚠️ Single-pass render failed, rendering per scene: {e.stderr.decode(errors='ignore')[-500:]}")
+            
+            def render(i, spec):
+                # 7. Animation + 9. Audio Mixing - all layers in a single pass
+                print(f"📽️ Rendering scene {i+1}/{len(scenes)}...")
+                return render_scene(
+                    spec.image_path,
+                    spec.dialogue_path,
+                    spec.audio_params,
+                    os.path.join(TEMP_DIR, f"scene_{i}_final.ts"),
+                    emotion=spec.emotion,
+                    duration=spec.duration
+                )
+            
+            # A failed render aborts the joiner (kills its ffmpeg, drops the partial MP4)
+            with ClipJoiner(raw_video) as joiner:
+                with ThreadPoolExecutor(max_workers=SCENE_RENDER_CONCURRENCY) as pool:
+                    futures = [pool.submit(render, i, spec) for i, spec in enumerate(scene_specs)]
+                    # Clip order follows scene order, not completion order
+                    for future in futures:
+                        joiner.add(future.result())
+                raw_video = joiner.close()
+        
         # 10. Composition
-        from video.composer import concatenate_clips, finalize_video
-        final_video = finalize_video(concatenate_clips(scene_clips, output_filename), output_filename)
+        final_video = finalize_video(raw_video, output_filename)
         print(f"✅ Pipeline COMPLETED! Final Video: {final_video}")
         return final_video
@@ -1,23 +1,32 @@
 # ocr_engine.py - EasyOCR implementation optimized for GPU
+import contextlib
+from functools import lru_cache
 import easyocr
 import torch
 import cv2
 from typing import List, Dict
 from config.config import OCR_LANGUAGES, USE_GPU
 
+@lru_cache(maxsize=1)
+def _get_reader(languages: tuple, gpu: bool) -> easyocr.Reader:
+    """One EasyOCR reader (~200MB of weights) per process."""
+    return easyocr.Reader(list(languages), gpu=gpu)
+
 class OCREngine:
     def __init__(self):
-        # Initialize EasyOCR reader
+        # Initialize EasyOCR reader (shared across engine instances)
         # gpu=True will use T4 GPU if available
-        self.reader = easyocr.Reader(OCR_LANGUAGES, gpu=USE_GPU)
-        print(f"🤖 OCR Engine Initialized (GPU: {USE_GPU and torch.cuda.is_available()})")
+        self.reader = _get_reader(tuple(OCR_LANGUAGES), USE_GPU)
+        # fp16 on CUDA: half the activation memory, tensor-core matmuls on T4/A100
+        self.fp16 = USE_GPU and torch.cuda.is_available()
+        print(f"🤖 OCR Engine Initialized (GPU: {self.fp16}, fp16: {self.fp16})")
 
-    def perform_ocr(self, image_path: str) -> List[Dict]:
-        """
-        Performs OCR on the given image.
-        Returns list of results: {'text': str, 'box': list, 'confidence': float}
-        """
-        results = self.reader.readtext(image_path)
+    def _inference_context(self):
+        if self.fp16:
+            return torch.autocast("cuda", dtype=torch.float16)
+        return contextlib.nullcontext()
+
+    def _format_results(self, results) -> List[Dict]:
         extracted = []
         for (bbox, text, prob) in results:
             extracted.append({
@@ -27,7 +36,48 @@ class OCREngine:
             })
         return extracted
 
+    def perform_ocr(self, image_path: str) -> List[Dict]:
+        """
+        Performs OCR on the given image.
+        Returns list of results: {'text': str, 'box': list, 'confidence': float}
+        """
+        with self._inference_context():
+            results = self.reader.readtext(image_path)
+        return self._format_results(results)
+
+    def perform_ocr_batch(self, image_paths: List[str], batch_size: int = 8) -> List[List[Dict]]:
+        """
+        Performs OCR on many images, batch_size images per GPU pass.
+        Panels are padded (white, bottom/right) to a common size per batch,
+        so boxes keep the original image coordinates.
+        Unreadable images yield an empty result list.
+        """
+        all_results = []
+        for start in range(0, len(image_paths), batch_size):
+            imgs = [cv2.imread(path) for path in image_paths[start:start + batch_size]]
+            valid = [img for img in imgs if img is not None]
+            batch_results = iter([])
+            if valid:
+                max_h = max(img.shape[0] for img in valid)
+                max_w = max(img.shape[1] for img in valid)
+                padded = [
+                    cv2.copyMakeBorder(img, 0, max_h - img.shape[0], 0, max_w - img.shape[1],
+                                       cv2.BORDER_CONSTANT, value=(255, 255, 255))
+                    for img in valid
+                ]
+                with self._inference_context():
+                    batch_results = iter(self.reader.readtext_batched(padded, batch_size=batch_size))
+            for img in imgs:
+                all_results.append(self._format_results(next(batch_results)) if img is not None else [])
+        return all_results
+
+    def get_full_text_batch(self, image_paths: List[str], batch_size: int = 8) -> List[str]:
+        """Returns the text of each image as a single string, in input order."""
+        return [
+            " ".join([res['text'] for res in results])
+            for results in self.perform_ocr_batch(image_paths, batch_size=batch_size)
+        ]
+
     def get_full_text(self, image_path: str) -> str:
         """Returns all text found in the image as a single string."""
-        results = self.perform_ocr(image_path)
-        return " ".join([res['text'] for res in results])
+        return self.get_full_text_batch([image_path])[0]
@@ -3,11 +3,27 @@ import cv2
 import numpy as np
 import os
 from typing import List, Tuple
-from config.config import PANEL_CONFIDENCE_THRESHOLD, TEMP_DIR
+from config.config import PANEL_CONFIDENCE_THRESHOLD, PANEL_ROW_HEIGHT, TEMP_DIR
+
+PANEL_JPEG_QUALITY = 90
 
 class PanelDetector:
-    def __init__(self):
-        pass
+    def __init__(self, high_quality: bool = False):
+        # high_quality: adaptive threshold at full resolution, for pages
+        # without clean white gutters (textured or gradient backgrounds)
+        self.high_quality = high_quality
+        self._kernels = {
+            size: cv2.getStructuringElement(cv2.MORPH_RECT, (size, size)) for size in (3, 5)
+        }
+        # Per-page uint8 scratch buffers; pages mostly share a size, so they are reused
+        self._buffers = {}
+
+    def _scratch(self, name: str, shape: Tuple[int, int]) -> np.ndarray:
+        """Scratch buffer of the given shape, reallocated only when the page size changes."""
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape != shape:
+            buf = self._buffers[name] = np.empty(shape, dtype=np.uint8)
+        return buf
 
     def detect_panels(self, image_path: str) -> List[Tuple[int, int, int, int]]:
         """
@@ -17,27 +33,47 @@ class PanelDetector:
         img = cv2.imread(image_path)
         if img is None:
             return []
+        return self._detect_panels_from_img(img)
 
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    def _detect_panels_from_img(self, img: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """Panel detection on an already decoded BGR page."""
+        page_h, page_w = img.shape[:2]
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY, dst=self._scratch("gray", (page_h, page_w)))
         
-        # Adaptive thresholding to handle various page backgrounds
-        thresh = cv2.adaptiveThreshold(
-            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-            cv2.THRESH_BINARY_INV, 11, 2
-        )
+        if self.high_quality:
+            # Adaptive thresholding to handle various page backgrounds
+            thresh = cv2.adaptiveThreshold(
+                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                cv2.THRESH_BINARY_INV, 11, 2,
+                dst=self._scratch("thresh", gray.shape)
+            )
+            kernel_size, scale = 5, 1
+        else:
+            # Gutters are globally white: Otsu on a half-size page is enough
+            gray = cv2.pyrDown(gray, dst=self._scratch("half", ((page_h + 1) // 2, (page_w + 1) // 2)))
+            _, thresh = cv2.threshold(
+                gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU,
+                dst=self._scratch("thresh", gray.shape)
+            )
+            kernel_size, scale = 3, 2
 
         # Morphological operations to join nearby lines and remove noise
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
-        morph = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+        morph = cv2.morphologyEx(
+            thresh, cv2.MORPH_CLOSE, self._kernels[kernel_size],
+            dst=self._scratch("morph", thresh.shape)
+        )
 
         # Find contours
         contours, _ = cv2.findContours(morph, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
-        page_area = img.shape[0] * img.shape[1]
+        page_area = page_h * page_w
         panels = []
 
         for cnt in contours:
             x, y, w, h = cv2.boundingRect(cnt)
+            # Back to full-resolution page coordinates
+            x, y = x * scale, y * scale
+            w, h = min(w * scale, page_w - x), min(h * scale, page_h - y)
             panel_area = w * h
             confidence = panel_area / page_area
 
@@ -50,9 +86,10 @@ class PanelDetector:
             panels = self._apply_fallbacks(img)
 
         # Sort panels: Top-to-Bottom, then Left-to-Right
-        # We use a y-threshold to group lines
-        y_threshold = 50
-        panels.sort(key=lambda b: (b[1] // y_threshold, b[0]))
+        # Rows are PANEL_ROW_HEIGHT-pixel bands; one vectorized stable sort
+        boxes = np.asarray(panels)
+        order = np.lexsort((boxes[:, 0], boxes[:, 1] // PANEL_ROW_HEIGHT))
+        panels = [panels[i] for i in order]
 
         return panels
 
@@ -70,14 +107,32 @@ class PanelDetector:
 
     def extract_and_save_panels(self, image_path: str, output_prefix: str) -> List[str]:
         """Extracts panels and saves them as individual files."""
+        # Decode once; detection and cropping share the same array
         img = cv2.imread(image_path)
-        panels = self.detect_panels(image_path)
+        if img is None:
+            return []
+        panels = self._detect_panels_from_img(img)
         paths = []
 
         for i, (x, y, w, h) in enumerate(panels):
             panel_img = img[y:y+h, x:x+w]
-            path = os.path.join(TEMP_DIR, f"{output_prefix}_panel_{i}.png")
-            cv2.imwrite(path, panel_img)
+            path = os.path.join(TEMP_DIR, f"{output_prefix}_panel_{i}.jpg")
+            cv2.imwrite(path, panel_img, [cv2.IMWRITE_JPEG_QUALITY, PANEL_JPEG_QUALITY])
             paths.append(path)
             
         return paths
+
+
+# Per-process detector for ProcessPoolExecutor workers
+_worker_detector = None
+
+def _init_detector_worker():
+    global _worker_detector
+    # One process per core already; keep OpenCV from oversubscribing each one
+    cv2.setNumThreads(1)
+    _worker_detector = PanelDetector()
+
+def _detect_page(args: Tuple[int, str]) -> Tuple[int, List[str]]:
+    """Worker entry point: extracts and saves the panels of one page."""
+    page_index, page_path = args
+    return page_index, _worker_detector.extract_and_save_panels(page_path, f"page_{page_index}")
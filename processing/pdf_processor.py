@@ -1,24 +1,39 @@
 # processing/pdf_processor.py - Lean PDF to Image Conversion (PyMuPDF)
 import os
+from concurrent.futures import ThreadPoolExecutor
+import cv2
 import fitz  # PyMuPDF
+import numpy as np
 from config.config import TEMP_DIR
 from typing import List
 
-def process_pdf(pdf_path: str) -> List[str]:
+JPEG_QUALITY = 85
+
+def _save_jpeg(pix, p_path: str):
+    """Encodes a rendered RGB pixmap as JPEG (OpenCV releases the GIL here)."""
+    rows = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+    rgb = rows[:, :pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+    cv2.imwrite(p_path, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+
+def process_pdf(pdf_path: str, dpi: int = 144) -> List[str]:
     """
     Converts a PDF to a list of page images using PyMuPDF.
-    Saved in TEMP_DIR.
+    Saved in TEMP_DIR as JPEG. dpi=144 is 2x zoom for better OCR.
     """
     print(f"📄 Processing PDF with PyMuPDF: {pdf_path}")
-    doc = fitz.open(pdf_path)
+    zoom = dpi / 72
+    matrix = fitz.Matrix(zoom, zoom)
     page_paths = []
-    
-    for i in range(len(doc)):
-        page = doc.load_page(i)
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2)) # 2x zoom for better OCR
-        p_path = os.path.join(TEMP_DIR, f"page_{i}.png")
-        pix.save(p_path)
-        page_paths.append(p_path)
-        
-    doc.close()
+
+    # MuPDF documents are not thread-safe: render here, encode on the pool
+    with fitz.open(pdf_path) as doc, ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+        futures = []
+        for i in range(len(doc)):
+            pix = doc.load_page(i).get_pixmap(matrix=matrix, colorspace=fitz.csRGB, alpha=False)
+            p_path = os.path.join(TEMP_DIR, f"page_{i}.jpg")
+            futures.append(pool.submit(_save_jpeg, pix, p_path))
+            page_paths.append(p_path)
+        for future in futures:
+            future.result()
+
     return page_paths
@@ -1,7 +1,21 @@
 # scene_grouper.py - Deterministic Panel Grouping
 import cv2
 import numpy as np
-from typing import List, Dict
+from typing import List, Dict, Tuple, Optional
+
+# dHash only needs a 9x8 thumbnail: let the JPEG/PNG decoder downscale 8x (64x fewer pixels)
+DHASH_DECODE_FLAGS = cv2.IMREAD_REDUCED_GRAYSCALE_8
+
+def dhash(img: np.ndarray) -> np.uint64:
+    """64-bit difference hash: sign of each horizontal gradient on a 9x8 thumbnail."""
+    small = cv2.resize(img, (9, 8), interpolation=cv2.INTER_AREA)
+    diff = small[:, 1:] > small[:, :-1]
+    return np.packbits(diff.ravel()).view(np.uint64)[0]
+
+def dhash_file(path: str) -> Optional[int]:
+    """dHash of an image file (grayscale, 1/8-scale decode); None if unreadable."""
+    img = cv2.imread(path, DHASH_DECODE_FLAGS)
+    return None if img is None else int(dhash(img))
 
 class SceneGrouper:
     def __init__(self):
@@ -15,17 +29,17 @@ class SceneGrouper:
         if not panel_paths:
             return []
 
+        # Simple visual similarity check: perceptual difference hash (one decode per panel)
+        hashes, valid = self._compute_hashes(panel_paths)
+        similar = self._consecutive_distance(hashes) <= 12  # Deterministic threshold (of 64 bits)
+        similar &= valid[:-1] & valid[1:]
+
         scenes = [[panel_paths[0]]]
-        
         for i in range(1, len(panel_paths)):
-            prev_path = panel_paths[i-1]
-            curr_path = panel_paths[i]
-            
-            # Simple visual similarity check: Color Histogram
-            if self._is_visually_similar(prev_path, curr_path):
-                scenes[-1].append(curr_path)
+            if similar[i-1]:
+                scenes[-1].append(panel_paths[i])
             else:
-                scenes.append([curr_path])
+                scenes.append([panel_paths[i]])
                 
         # Limit scene size to avoid overly long clips (deterministic cap)
         final_scenes = []
@@ -38,19 +52,22 @@ class SceneGrouper:
                 
         return final_scenes
 
-    def _is_visually_similar(self, path1: str, path2: str) -> bool:
-        """Determines if two images are visually similar using histograms."""
-        img1 = cv2.imread(path1)
-        img2 = cv2.imread(path2)
-        
-        if img1 is None or img2 is None:
-            return False
-            
-        hist1 = cv2.calcHist([img1], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
-        hist2 = cv2.calcHist([img2], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
-        
-        cv2.normalize(hist1, hist1)
-        cv2.normalize(hist2, hist2)
-        
-        similarity = cv2.compareHist(hist1, hist2, cv2.HISTCMP_CORREL)
-        return similarity > 0.7  # Deterministic threshold
+    def _compute_hashes(self, panel_paths: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Decodes each panel once (grayscale, 1/8 scale) into its dHash.
+        Returns an (N,) uint64 array and an (N,) mask of readable panels.
+        """
+        hashes = np.zeros(len(panel_paths), dtype=np.uint64)
+        valid = np.zeros(len(panel_paths), dtype=bool)
+        for i, path in enumerate(panel_paths):
+            img = cv2.imread(path, DHASH_DECODE_FLAGS)
+            if img is None:
+                continue
+            hashes[i] = dhash(img)
+            valid[i] = True
+        return hashes, valid
+
+    def _consecutive_distance(self, hashes: np.ndarray) -> np.ndarray:
+        """Hamming distance (XOR + popcount) of each panel's hash to the next."""
+        xor = hashes[:-1] ^ hashes[1:]
+        return np.unpackbits(xor.view(np.uint8)).reshape(-1, 64).sum(axis=1)
@@ -23,32 +23,29 @@ def generate_all_assets():
     
     generator = AudioAssetGenerator()
     
-    # Generate BGM
-    print("\n" + "=" * 60)
-    print("🎵 GENERATING BGM LIBRARY")
-    print("=" * 60)
-    
     bgm_moods = ["calm", "tense", "heroic", "sad"]
-    for mood in bgm_moods:
-        generator.generate_bgm(mood, duration=30, num_variations=5)
+    sfx_types = ["punch", "slash", "explosion", "hit"]
+    ambience_types = ["wind", "sea", "crowd", "room"]
+    
+    # Load both models up front; BGM (MusicGen) and SFX + ambience (AudioLDM 2)
+    # then run side by side on separate CUDA streams
+    generator.music_model
+    generator.sfx_model
     
-    # Generate SFX
     print("\n" + "=" * 60)
-    print("🔊 GENERATING SFX LIBRARY")
+    print("🎵 GENERATING BGM + 🔊 SFX + 🌊 AMBIENCE LIBRARIES")
     print("=" * 60)
     
-    sfx_types = ["punch", "slash", "explosion", "hit"]
-    for sfx_type in sfx_types:
-        generator.generate_sfx(sfx_type, duration=1.0)
+    def generate_bgm():
+        generator.generate_bgm_batch(bgm_moods, duration=30, num_variations=5)
     
-    # Generate Ambience
-    print("\n" + "=" * 60)
-    print("🌊 GENERATING AMBIENCE LIBRARY")
-    print("=" * 60)
+    def generate_sfx_and_ambience():
+        for sfx_type in sfx_types:
+            generator.generate_sfx(sfx_type, duration=1.0)
+        for ambience_type in ambience_types:
+            generator.generate_ambience(ambience_type, duration=30)
     
-    ambience_types = ["wind", "sea", "crowd", "room"]
-    for ambience_type in ambience_types:
-        generator.generate_ambience(ambience_type, duration=30)
+    generator.run_concurrently(generate_bgm, generate_sfx_and_ambience)
     
     # Generate Stingers
     print("\n" + "=" * 60)
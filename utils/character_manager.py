@@ -3,14 +3,26 @@ Character Asset Manager
 Auto-creates character folders when new characters are detected.
 """
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
+# Folder creation is syscall-bound (os.makedirs releases the GIL)
+FOLDER_WORKERS = 8
+
+# Attack audio file types (matched case-insensitively)
+_AUDIO_EXTS = frozenset({'.wav', '.mp3'})
+
 class CharacterAssetManager:
     """Manages character audio asset directories."""
     
     def __init__(self, base_dir: str = "assets/characters"):
         self.base_dir = base_dir
         os.makedirs(base_dir, exist_ok=True)
+        # Character dirs already checked this run (skips the exists() stat)
+        self._known_characters = set()
+        # Keeps the "new character" banners from interleaving across threads
+        self._print_lock = threading.Lock()
     
     def ensure_character_folders(self, character_name: str) -> dict:
         """
@@ -31,21 +43,32 @@ class CharacterAssetManager:
         character_dir = os.path.join(self.base_dir, character_name)
         attacks_dir = os.path.join(character_dir, "attacks")
         
-        is_new = not os.path.exists(character_dir)
+        is_new = False
+        if character_name not in self._known_characters:
+            # Creating the dir is the existence check, so concurrent calls
+            # for the same character cannot both report it as new
+            try:
+                os.makedirs(character_dir)
+                is_new = True
+            except FileExistsError:
+                pass
         
         if is_new:
             # Create only attacks directory (narrator handles personality)
             os.makedirs(attacks_dir, exist_ok=True)
             
-            print(f"\n{'='*60}")
-            print(f"🆕 NEW CHARACTER DETECTED: {character_name.upper()}")
-            print(f"{'='*60}")
-            print(f"✅ Created: {character_dir}/")
-            print(f"   └── attacks/")
-            print(f"\n💡 Add attack audio when ready:")
-            print(f"   - Attack SFX: {attacks_dir}/{{attack_name}}.wav")
-            print(f"   - If no audio → Narrator describes attack by name")
-            print(f"{'='*60}\n")
+            with self._print_lock:
+                print(f"\n{'='*60}")
+                print(f"🆕 NEW CHARACTER DETECTED: {character_name.upper()}")
+                print(f"{'='*60}")
+                print(f"✅ Created: {character_dir}/")
+                print(f"   └── attacks/")
+                print(f"\n💡 Add attack audio when ready:")
+                print(f"   - Attack SFX: {attacks_dir}/{{attack_name}}.wav")
+                print(f"   - If no audio → Narrator describes attack by name")
+                print(f"{'='*60}\n")
+        
+        self._known_characters.add(character_name)
         
         return {
             "character": character_name,
@@ -63,12 +86,11 @@ class CharacterAssetManager:
         Returns:
             List of character folder info dicts
         """
-        results = []
-        for name in character_names:
-            if name and name.strip():
-                result = self.ensure_character_folders(name)
-                results.append(result)
-        return results
+        names = [name for name in character_names if name and name.strip()]
+        if len(names) <= 1:
+            return [self.ensure_character_folders(name) for name in names]
+        with ThreadPoolExecutor(max_workers=min(FOLDER_WORKERS, len(names))) as executor:
+            return list(executor.map(self.ensure_character_folders, names))
     
     def list_characters(self) -> List[str]:
         """
@@ -77,16 +99,12 @@ class CharacterAssetManager:
         Returns:
             List of character names
         """
-        if not os.path.exists(self.base_dir):
+        try:
+            # DirEntry.is_dir() reuses the readdir type info (no stat per entry)
+            with os.scandir(self.base_dir) as entries:
+                return sorted(e.name for e in entries if e.is_dir() and e.name != "README.md")
+        except FileNotFoundError:
             return []
-        
-        characters = []
-        for item in os.listdir(self.base_dir):
-            item_path = os.path.join(self.base_dir, item)
-            if os.path.isdir(item_path) and item != "README.md":
-                characters.append(item)
-        
-        return sorted(characters)
     
     def get_character_assets(self, character_name: str) -> dict:
         """
@@ -103,13 +121,15 @@ class CharacterAssetManager:
         character_name = character_name.lower().strip()
         character_dir = os.path.join(self.base_dir, character_name)
         
-        attacks = []
-        
         attacks_dir = os.path.join(character_dir, "attacks")
-        if os.path.exists(attacks_dir):
-            for file in os.listdir(attacks_dir):
-                if file.endswith(('.wav', '.mp3')):
-                    attacks.append(os.path.splitext(file)[0])
+        try:
+            with os.scandir(attacks_dir) as entries:
+                attacks = [
+                    stem for stem, ext in (os.path.splitext(e.name) for e in entries if e.is_file())
+                    if ext.lower() in _AUDIO_EXTS
+                ]
+        except (FileNotFoundError, NotADirectoryError):
+            attacks = []
         
         return {
             "attacks": sorted(attacks)
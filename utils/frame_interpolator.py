@@ -4,10 +4,34 @@ Selective RIFE 48 FPS interpolation with mandatory guards.
 """
 import os
 import logging
-from typing import Optional
+from functools import lru_cache
+import av
+import numpy as np
+from typing import Iterator
 
 logger = logging.getLogger(__name__)
 
+# ncnn worker threads inside each RIFE process() call (the rife-ncnn-vulkan CLI's "proc" threads)
+RIFE_PROC_THREADS = 2
+
+@lru_cache(maxsize=1)
+def _get_rife():
+    """
+    One RIFE instance per process. Creating it builds the Vulkan pipelines
+    (shader compilation); every later scene and interpolator reuses them.
+    """
+    from rife_ncnn_vulkan_python import Rife
+    rife = Rife(
+        gpuid=0,
+        model='rife-v4.6',
+        tta_mode=False,
+        tta_temporal_mode=False,
+        uhd_mode=False,
+        num_threads=RIFE_PROC_THREADS
+    )
+    logger.info("✅ RIFE v4.6 model loaded")
+    return rife
+
 class FrameInterpolator:
     """
     Production-safe frame interpolation using RIFE v4.6.
@@ -29,16 +53,7 @@ class FrameInterpolator:
         """Lazy load RIFE model."""
         if self._rife is None:
             try:
-                from rife_ncnn_vulkan_python import Rife
-                self._rife = Rife(
-                    gpuid=0,
-                    model='rife-v4.6',
-                    tta_mode=False,
-                    tta_temporal_mode=False,
-                    uhd_mode=False,
-                    num_threads=2
-                )
-                logger.info("✅ RIFE v4.6 model loaded")
+                self._rife = _get_rife()
             except ImportError:
                 logger.error("❌ RIFE not installed. Run: pip install rife-ncnn-vulkan-python")
                 raise
@@ -103,68 +118,47 @@ class FrameInterpolator:
         try:
             logger.info(f"⚡ Interpolating to 48 FPS: {os.path.basename(video_path)}")
             
-            # Use FFmpeg + RIFE for interpolation
-            import subprocess
-            
-            # Extract frames at 30 FPS
-            frames_dir = video_path.replace('.mp4', '_frames')
-            os.makedirs(frames_dir, exist_ok=True)
-            
-            subprocess.run([
-                'ffmpeg', '-i', video_path,
-                '-vf', 'fps=30',
-                f'{frames_dir}/frame_%04d.png'
-            ], check=True, capture_output=True)
-            
-            # Get frame list
-            import glob
-            frames = sorted(glob.glob(f'{frames_dir}/frame_*.png'))
-            
-            if len(frames) < 2:
-                logger.warning("⚠️ Not enough frames for interpolation")
-                return video_path
-            
-            # Interpolate frames with RIFE
-            interpolated_dir = video_path.replace('.mp4', '_interpolated')
-            os.makedirs(interpolated_dir, exist_ok=True)
-            
-            frame_idx = 0
-            for i in range(len(frames) - 1):
-                # Read frames
-                import cv2
-                frame1 = cv2.imread(frames[i])
-                frame2 = cv2.imread(frames[i + 1])
+            # Decode → RIFE → encode in-process with PyAV (no ffmpeg processes, no PNGs)
+            with av.open(video_path) as container, av.open(output_path, 'w') as output:
+                frames = self._decode_frames(container)
+                frame1 = next(frames, None)
+                frame2 = next(frames, None)
+                if frame2 is None:
+                    logger.warning("⚠️ Not enough frames for interpolation")
+                    return video_path
                 
-                # Save original frame
-                cv2.imwrite(f'{interpolated_dir}/frame_{frame_idx:04d}.png', frame1)
-                frame_idx += 1
+                # Encode to video at 48 FPS
+                height, width = frame1.shape[:2]
+                stream = output.add_stream('libx264', rate=48)
+                stream.width = width
+                stream.height = height
+                stream.pix_fmt = 'yuv420p'
+                stream.options = {'crf': '18'}
                 
-                # Generate intermediate frame (30 → 48 FPS = 1.6× = 1 intermediate frame per 2 original)
-                if i % 2 == 0:
-                    try:
-                        intermediate = self.rife.process(frame1, frame2)
-                        cv2.imwrite(f'{interpolated_dir}/frame_{frame_idx:04d}.png', intermediate)
-                        frame_idx += 1
-                    except Exception as e:
-                        logger.warning(f"⚠️ RIFE frame interpolation failed: {e}")
-                        # Continue without this intermediate frame
-            
-            # Save last frame
-            cv2.imwrite(f'{interpolated_dir}/frame_{frame_idx:04d}.png', cv2.imread(frames[-1]))
-            
-            # Encode to video at 48 FPS
-            subprocess.run([
-                'ffmpeg', '-framerate', '48',
-                '-i', f'{interpolated_dir}/frame_%04d.png',
-                '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
-                '-crf', '18',
-                output_path
-            ], check=True, capture_output=True)
-            
-            # Cleanup
-            import shutil
-            shutil.rmtree(frames_dir)
-            shutil.rmtree(interpolated_dir)
+                def write(frame):
+                    output.mux(stream.encode(av.VideoFrame.from_ndarray(frame, format='bgr24')))
+                
+                # One process() call at a time: the wrapper keeps its I/O buffers on the
+                # instance, and ncnn already spreads each call over RIFE_PROC_THREADS
+                i = 0
+                while frame2 is not None:
+                    write(frame1)
+                    
+                    # Generate intermediate frame (30 → 48 FPS = 1.6× = 1 intermediate frame per 2 original)
+                    if i % 2 == 0:
+                        try:
+                            middle = np.ascontiguousarray(self.rife.process(frame1, frame2), dtype=np.uint8)
+                        except Exception as e:
+                            logger.warning(f"⚠️ RIFE frame interpolation failed: {e}")
+                        else:
+                            write(middle)  # Skipped on failure: continue without this intermediate frame
+                    
+                    i += 1
+                    frame1, frame2 = frame2, next(frames, None)
+                
+                # Write last frame, then flush the encoder
+                write(frame1)
+                output.mux(stream.encode())
             
             logger.info(f"✅ Interpolated to 48 FPS: {os.path.basename(output_path)}")
             
@@ -175,6 +169,32 @@ class FrameInterpolator:
             logger.warning(f"⚠️ RIFE interpolation failed, falling back to 30 FPS: {e}")
             return video_path  # Preserve stability - return original
     
+    def _decode_frames(self, container) -> Iterator[np.ndarray]:
+        """Yields the video's frames as BGR arrays, resampled to 30 FPS."""
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        
+        graph = av.filter.Graph()
+        source = graph.add_buffer(template=stream)
+        fps = graph.add('fps', '30')
+        sink = graph.add('buffersink')
+        source.link_to(fps)
+        fps.link_to(sink)
+        graph.configure()
+        
+        def pull():
+            while True:
+                try:
+                    yield graph.pull().to_ndarray(format='bgr24')
+                except (BlockingIOError, EOFError):
+                    return
+        
+        for frame in container.decode(stream):
+            graph.push(frame)
+            yield from pull()
+        graph.push(None)  # Flush the fps filter
+        yield from pull()
+    
     def get_stats(self) -> dict:
         """
         Get interpolation statistics.
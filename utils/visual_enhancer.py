@@ -3,14 +3,81 @@ Visual Enhancement Module - Tier-1 Production-Safe
 Real-CUGAN 2× upscaling with hash-based caching.
 """
 import os
+import subprocess
+import tempfile
 import cv2
 import hashlib
+import itertools
+import mmap
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple
 import logging
+try:
+    import xxhash
+    _file_hasher = xxhash.xxh3_128
+except ImportError:
+    _file_hasher = lambda: hashlib.blake2b(digest_size=16)
 
 logger = logging.getLogger(__name__)
 
+# Panels are hashed in 1 MiB chunks; larger files are hashed straight from an mmap
+FILE_HASH_CHUNK_SIZE = 1 << 20
+FILE_HASH_MMAP_MIN_SIZE = 8 << 20
+
+# Cached panels are stored as <content hash>.<SR tag><CACHE_EXT> in cache_dir; the
+# tag records which model produced them (untagged files from older runs are ignored).
+# Lossless PNG at zlib level 1: no JPEG loss on the line art Real-CUGAN just
+# produced, and ~3× faster to write than the default level
+CACHE_EXT = ".png"
+CACHE_WRITE_PARAMS = [cv2.IMWRITE_PNG_COMPRESSION, 1]
+SR_TAG_REALCUGAN = "cugan"
+SR_TAG_ESPCN = "espcn"
+SR_TAGS = (SR_TAG_REALCUGAN, SR_TAG_ESPCN)
+
+# Panels whose Laplacian variance is below this are "simple" (flat tone) and take
+# the light SR path: ESPCN (opencv-contrib dnn_superres), if its model is present.
+# Everything else, and every panel without the ESPCN model, goes to Real-CUGAN.
+SIMPLE_PANEL_LAPLACIAN_VAR = 200
+ESPCN_MODEL_PATH = "models/ESPCN_x2.pb"
+
+# upscale_panels: hash/decode and encode threads, and panels decoded ahead of the GPU
+UPSCALE_IO_WORKERS = 4
+UPSCALE_PREFETCH = 8
+
+# Upscaled panels kept decoded in memory for upscale_panel(..., in_memory=True)
+UPSCALE_MEMORY_CACHE_SIZE = 16
+
+# Real-CUGAN tile size by free VRAM (MB): largest tile that fits, fewer GPU submissions
+# per panel. Unknown VRAM (no NVIDIA tooling) leaves it to ncnn (0 = auto).
+REALCUGAN_TILESIZE_BY_FREE_MB = ((8192, 400), (4096, 200))
+REALCUGAN_MIN_TILESIZE = 100
+
+def _free_vram_mb() -> Optional[int]:
+    """Free VRAM on GPU 0 via torch, else nvidia-smi; None if neither is available."""
+    from infra import gpu_utils
+    status = gpu_utils.get_gpu_status()
+    if status["available"] and status["free_mb"]:
+        return status["free_mb"]
+    try:
+        out = subprocess.check_output(
+            ["nvidia-smi", "--query-gpu=memory.free", "--format=csv,noheader,nounits", "--id=0"],
+            stderr=subprocess.DEVNULL
+        )
+        return int(out)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+def _pick_tilesize() -> int:
+    free_mb = _free_vram_mb()
+    if free_mb is None:
+        return 0
+    for min_free_mb, tilesize in REALCUGAN_TILESIZE_BY_FREE_MB:
+        if free_mb > min_free_mb:
+            return tilesize
+    return REALCUGAN_MIN_TILESIZE
+
 class VisualEnhancer:
     """
     Production-safe visual enhancement using Real-CUGAN 2× upscaling.
@@ -33,7 +100,9 @@ class VisualEnhancer:
         os.makedirs(cache_dir, exist_ok=True)
         
         self._upscaler = None
-        self._cache: Dict[str, str] = {}
+        self._fast_upscaler = None
+        self._cache: Dict[str, str] = self._scan_cache()
+        self._memory_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
         
         logger.info("✅ VisualEnhancer initialized (Real-CUGAN 2×)")
     
@@ -43,20 +112,39 @@ class VisualEnhancer:
         if self._upscaler is None:
             try:
                 from realcugan_ncnn_vulkan_python import Realcugan
+                tilesize = _pick_tilesize()
+                # fp16 storage/arithmetic is enabled by ncnn on GPUs that support it (T4 does)
                 self._upscaler = Realcugan(
-                    gpuid=0,      # Use GPU 0
-                    scale=2,      # 2× upscaling (not 4×)
-                    noise=0       # No denoising (preserve line art)
+                    gpuid=0,        # Use GPU 0
+                    scale=2,        # 2× upscaling (not 4×)
+                    noise=0,        # No denoising (preserve line art)
+                    tta_mode=False, # No 8× test-time augmentation
+                    num_threads=2,  # Overlap upload/compute/download
+                    tilesize=tilesize # By free VRAM (0 = ncnn auto)
                 )
-                logger.info("✅ Real-CUGAN model loaded (2× scale)")
+                logger.info(f"✅ Real-CUGAN model loaded (2× scale, tile size {tilesize or 'auto'})")
             except ImportError:
                 logger.error("❌ Real-CUGAN not installed. Run: pip install realcugan-ncnn-vulkan-python")
                 raise
         return self._upscaler
     
+    def _scan_cache(self) -> Dict[str, str]:
+        """Content hash → cached path for every panel already in cache_dir (warm runs)."""
+        cache = {}
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name)
+                cache_key, _, tag = stem.partition(".")
+                if ext == CACHE_EXT and tag in SR_TAGS and entry.is_file():
+                    cache[cache_key] = entry.path
+        return cache
+    
+    def _cache_path(self, cache_key: str, tag: str) -> str:
+        return os.path.join(self.cache_dir, f"{cache_key}.{tag}{CACHE_EXT}")
+    
     def _hash_file(self, path: str) -> str:
         """
-        Generate MD5 hash of file content.
+        Generate a 128-bit hash of file content (xxh3-128, or BLAKE2b without xxhash).
         
         CRITICAL: Use content hash, NOT file path, for cache key.
         This prevents wrong reuse if same path has different content.
@@ -65,58 +153,218 @@ class VisualEnhancer:
             path: Path to file
             
         Returns:
-            MD5 hash of file content
+            Hex digest of file content
         """
+        hasher = _file_hasher()
         with open(path, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()
+            if os.fstat(f.fileno()).st_size >= FILE_HASH_MMAP_MIN_SIZE:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    hasher.update(mapped)
+            else:
+                for chunk in iter(lambda: f.read(FILE_HASH_CHUNK_SIZE), b''):
+                    hasher.update(chunk)
+        return hasher.hexdigest()
     
-    def upscale_panel(self, panel_path: str, force: bool = False) -> str:
+    def _prepare_panel(self, panel_path: str, force: bool) -> Tuple[str, Optional[str], Optional[np.ndarray]]:
         """
-        Upscale manga panel 2× with hash-based caching.
+        Hashes and (on a cache miss) decodes a panel.
         
-        Args:
-            panel_path: Path to manga panel
-            force: Force re-upscaling (skip cache)
-            
         Returns:
-            Path to upscaled panel
+            (path, cache_key, panel): panel is None when path is already the
+            final result (cache hit, or the original on load failure)
         """
         # Generate cache key from file content hash
         cache_key = self._hash_file(panel_path)
         
-        # Check cache
-        if not force and cache_key in self._cache:
-            cached_path = self._cache[cache_key]
-            if os.path.exists(cached_path):
-                logger.debug(f"✅ Using cached upscaled panel: {cache_key[:8]}")
-                return cached_path
+        # Check cache (on disk too, in case another run or instance wrote it)
+        if not force:
+            candidates = [self._cache[cache_key]] if cache_key in self._cache else []
+            candidates.extend(self._cache_path(cache_key, tag) for tag in SR_TAGS)
+            for cached_path in candidates:
+                if os.path.exists(cached_path):
+                    logger.debug(f"✅ Using cached upscaled panel: {cache_key[:8]}")
+                    self._cache[cache_key] = cached_path
+                    return cached_path, cache_key, None
         
         # Load panel
         panel = cv2.imread(panel_path)
         if panel is None:
             logger.error(f"❌ Failed to load panel: {panel_path}")
-            return panel_path  # Return original on failure
+            return panel_path, cache_key, None  # Return original on failure
+        
+        return panel_path, cache_key, panel
+    
+    @property
+    def fast_upscaler(self):
+        """Lazy load the light 2× SR model for simple panels (False if unavailable)."""
+        if self._fast_upscaler is None:
+            self._fast_upscaler = False
+            if os.path.exists(ESPCN_MODEL_PATH) and hasattr(cv2, "dnn_superres"):
+                try:
+                    model = cv2.dnn_superres.DnnSuperResImpl_create()
+                    model.readModel(ESPCN_MODEL_PATH)
+                    model.setModel("espcn", 2)
+                    self._fast_upscaler = model
+                    logger.info("✅ ESPCN model loaded (2× scale, simple panels)")
+                except cv2.error as e:
+                    logger.warning(f"⚠️ ESPCN unavailable, using Real-CUGAN for simple panels: {e}")
+        return self._fast_upscaler
+    
+    def _is_simple(self, panel: np.ndarray) -> bool:
+        """Flat-tone panels (low Laplacian variance) don't need Real-CUGAN."""
+        gray = cv2.cvtColor(panel, cv2.COLOR_BGR2GRAY)
+        _, stddev = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+        return stddev[0, 0] ** 2 < SIMPLE_PANEL_LAPLACIAN_VAR
+    
+    def _upscale(self, panel_path: str, panel: np.ndarray) -> Tuple[Optional[np.ndarray], str]:
+        """
+        Upscale with Real-CUGAN (ESPCN for simple panels when its model is present).
+        Returns (upscaled or None on failure, SR tag of the model used).
+        """
+        if self.fast_upscaler and self._is_simple(panel):
+            logger.info(f"🎨 Upscaling simple panel 2× (ESPCN): {os.path.basename(panel_path)}")
+            return self.fast_upscaler.upsample(panel), SR_TAG_ESPCN
         
-        # Upscale with Real-CUGAN
         logger.info(f"🎨 Upscaling panel 2× (Real-CUGAN): {os.path.basename(panel_path)}")
         
         try:
-            upscaled = self.upscaler.process(panel)
+            return self.upscaler.process(panel), SR_TAG_REALCUGAN
         except Exception as e:
             logger.error(f"❌ Real-CUGAN failed: {e}")
-            return panel_path  # Soft fallback to original
+            return None, SR_TAG_REALCUGAN
+    
+    def _save_upscaled(
+        self, panel_path: str, cache_key: str, tag: str, panel_shape: tuple, upscaled: np.ndarray
+    ) -> str:
+        """Writes an upscaled panel into the cache; returns its path (original on failure)."""
+        output_path = self._cache_path(cache_key, tag)
         
-        # Save upscaled panel
-        output_path = os.path.join(self.cache_dir, f"{cache_key}.jpg")
-        cv2.imwrite(output_path, upscaled, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        # Save upscaled panel (temp + rename: a crash never leaves a truncated cache hit).
+        # Unique temp name: concurrent writers of the same key must not share a file
+        fd, temp_path = tempfile.mkstemp(prefix=".tmp-", suffix=CACHE_EXT, dir=self.cache_dir)
+        os.close(fd)
+        if not cv2.imwrite(temp_path, upscaled, CACHE_WRITE_PARAMS):
+            os.remove(temp_path)
+            logger.error(f"❌ Failed to write upscaled panel: {output_path}")
+            return panel_path
+        os.replace(temp_path, output_path)
         
         # Update cache
         self._cache[cache_key] = output_path
         
-        logger.info(f"✅ Upscaled: {panel.shape} → {upscaled.shape}")
+        logger.info(f"✅ Upscaled: {panel_shape} → {upscaled.shape}")
         
         return output_path
     
+    def _remember(self, cache_key: str, upscaled: np.ndarray):
+        """Keeps an upscaled panel decoded (LRU of UPSCALE_MEMORY_CACHE_SIZE)."""
+        self._memory_cache[cache_key] = upscaled
+        self._memory_cache.move_to_end(cache_key)
+        while len(self._memory_cache) > UPSCALE_MEMORY_CACHE_SIZE:
+            self._memory_cache.popitem(last=False)
+    
+    def _load_result(self, path: str, cache_key: str) -> Optional[np.ndarray]:
+        """Array for a finished result: from memory if hot, else decoded from disk."""
+        upscaled = self._memory_cache.get(cache_key)
+        if upscaled is not None:
+            self._memory_cache.move_to_end(cache_key)
+            return upscaled
+        
+        upscaled = cv2.imread(path)
+        if upscaled is not None and path == self._cache.get(cache_key):
+            self._remember(cache_key, upscaled)
+        return upscaled
+    
+    def upscale_panel(self, panel_path: str, force: bool = False, in_memory: bool = False):
+        """
+        Upscale manga panel 2× with hash-based caching.
+        
+        Args:
+            panel_path: Path to manga panel
+            force: Force re-upscaling (skip cache)
+            in_memory: Return the BGR array instead of a path (no decode of the
+                cached file on hot calls; pass it to the animation engine as is)
+            
+        Returns:
+            Path to upscaled panel (in_memory: its array, None if unreadable)
+        """
+        path, cache_key, panel = self._prepare_panel(panel_path, force)
+        if panel is None:
+            return self._load_result(path, cache_key) if in_memory else path
+        
+        upscaled, tag = self._upscale(panel_path, panel)
+        if upscaled is None:
+            return panel if in_memory else panel_path  # Soft fallback to original
+        
+        # Disk cache is still written, for reuse across runs
+        output_path = self._save_upscaled(panel_path, cache_key, tag, panel.shape, upscaled)
+        if in_memory:
+            self._remember(cache_key, upscaled)
+            return upscaled
+        return output_path
+    
+    def upscale_panels(self, panel_paths: List[str], force: bool = False) -> List[str]:
+        """
+        Upscale many panels, keeping the GPU busy: hashing/decoding of the next
+        panels and encoding of finished ones run on threads around Real-CUGAN.
+        
+        Args:
+            panel_paths: Paths to manga panels
+            force: Force re-upscaling (skip cache)
+            
+        Returns:
+            Path to upscaled panel for each input, in order
+        """
+        if not panel_paths:
+            return []
+        
+        # Pay the Vulkan/model init once, before the pipeline starts
+        try:
+            self.upscaler
+        except ImportError:
+            return list(panel_paths)  # Soft fallback to originals
+        
+        results: List[Optional[str]] = [None] * len(panel_paths)
+        with ThreadPoolExecutor(max_workers=UPSCALE_IO_WORKERS) as loader, \
+                ThreadPoolExecutor(max_workers=UPSCALE_IO_WORKERS) as writer:
+            # Decoded panels held in memory are bounded by the prefetch window
+            prepared = deque()
+            upcoming = iter(enumerate(panel_paths))
+            for i, path in itertools.islice(upcoming, UPSCALE_PREFETCH):
+                prepared.append((i, path, loader.submit(self._prepare_panel, path, force)))
+            
+            saves = []
+            # Byte-identical panels (blank/repeated crops) are upscaled once per batch
+            first_by_key: Dict[str, int] = {}
+            duplicates = []
+            while prepared:
+                i, path, future = prepared.popleft()
+                for j, next_path in itertools.islice(upcoming, 1):
+                    prepared.append((j, next_path, loader.submit(self._prepare_panel, next_path, force)))
+                
+                results[i], cache_key, panel = future.result()
+                if panel is None:
+                    continue
+                if cache_key in first_by_key:
+                    duplicates.append((i, first_by_key[cache_key]))
+                    continue
+                first_by_key[cache_key] = i
+                
+                upscaled, tag = self._upscale(path, panel)
+                if upscaled is None:
+                    results[i] = path  # Soft fallback to original
+                    continue
+                saves.append((i, writer.submit(self._save_upscaled, path, cache_key, tag, panel.shape, upscaled)))
+            
+            for i, future in saves:
+                results[i] = future.result()
+        
+        for i, first in duplicates:
+            # A soft fallback to the first copy's original falls back to this copy's own
+            results[i] = panel_paths[i] if results[first] == panel_paths[first] else results[first]
+        
+        return results
+    
     def get_cache_stats(self) -> Dict:
         """
         Get cache statistics.
@@ -124,11 +372,8 @@ class VisualEnhancer:
         Returns:
             Cache stats (hits, size, etc.)
         """
-        cache_size = sum(
-            os.path.getsize(os.path.join(self.cache_dir, f))
-            for f in os.listdir(self.cache_dir)
-            if os.path.isfile(os.path.join(self.cache_dir, f))
-        )
+        with os.scandir(self.cache_dir) as entries:
+            cache_size = sum(entry.stat().st_size for entry in entries if entry.is_file())
         
         return {
             "cached_panels": len(self._cache),
@@ -142,4 +387,5 @@ class VisualEnhancer:
         shutil.rmtree(self.cache_dir)
         os.makedirs(self.cache_dir, exist_ok=True)
         self._cache.clear()
+        self._memory_cache.clear()
         logger.info("🗑️ Upscaling cache cleared")
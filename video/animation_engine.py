@@ -1,8 +1,11 @@
 import os
+import re
 import subprocess
 import math
-from typing import List, Dict, Optional
-from config.config import FPS, WIDTH, HEIGHT
+import numpy as np
+from functools import lru_cache
+from typing import List, Dict, Optional, Union
+from config.config import FPS, WIDTH, HEIGHT, VIDEO_ENCODER, VIDEO_HWSCALE
 
 # ==================== RULE TABLES ====================
 # emotion -> camera_mode
@@ -65,15 +68,174 @@ CAMERA_TO_FILTER = {
     )
 }
 
-def get_audio_duration(audio_path: str) -> float:
-    """Helper to get duration via ffprobe."""
+# CAMERA_TO_FILTER with fps/w/h filled in once per process; {frames} is the
+# only placeholder left for the per-scene format call
+CAMERA_TO_FILTER_FMT = {
+    camera_mode: template.format(frames="{frames}", fps=FPS, w=WIDTH, h=HEIGHT)
+    for camera_mode, template in CAMERA_TO_FILTER.items()
+}
+
+def _cuda_scale_template(template: str) -> str:
+    """
+    Moves a template's leading fixed-size upscale onto the GPU (scale_cuda);
+    zoompan/crop stay on the CPU. STATIC's fit-to-frame scale is left as is.
+    Plain hwupload uses the command's shared device (CUDA_HW_DEVICE_ARGS):
+    hwupload_cuda would open a CUDA context per scene in a chapter graph.
+    """
+    match = re.match(r"scale=(-?\d+):(-?\d+),", template)
+    if not match:
+        return template
+    # -2: CUDA frames are yuv420p, which needs even dimensions
+    w, h = (dim if dim != "-1" else "-2" for dim in match.groups())
+    return (
+        f"format=yuv420p,hwupload,scale_cuda={w}:{h},hwdownload,format=yuv420p,"
+        + template[match.end():]
+    )
+
+# One CUDA device per ffmpeg command, shared by every hwupload in its graph
+CUDA_HW_DEVICE_ARGS = ["-init_hw_device", "cuda=cu", "-filter_hw_device", "cu"]
+
+# CAMERA_TO_FILTER_FMT with the big scale done by scale_cuda (see use_cuda_scaling)
+CAMERA_TO_FILTER_FMT_CUDA = {
+    camera_mode: _cuda_scale_template(template)
+    for camera_mode, template in CAMERA_TO_FILTER_FMT.items()
+}
+
+# camera_mode -> SFX sync intensity
+CAMERA_INTENSITY = {
+    "STATIC": "low",
+    "ZOOM_IN": "medium",
+    "ZOOM_OUT": "medium",
+    "PAN_LEFT": "low",
+    "PAN_RIGHT": "low",
+    "SHAKE": "high",
+    "SHAKE_AGRESSIVE": "high",
+    "ZOOM_IN_FAST": "high"
+}
+
+# encoder -> FFmpeg video codec arguments
+# Hardware encoders are tried in this order; libx264 is the software fallback
+VIDEO_ENCODER_ARGS = {
+    "h264_nvenc": ["-c:v", "h264_nvenc", "-preset", "p4", "-tune", "hq", "-rc", "vbr", "-cq", "23", "-b:v", "0"],
+    "h264_videotoolbox": ["-c:v", "h264_videotoolbox", "-q:v", "65"],
+    # Delivered video (chapter/scene renders): x264 defaults for B-frames and refs
+    "libx264": ["-c:v", "libx264", "-preset", "medium", "-threads", "0"],
+}
+
+# libx264 for clips that are re-encoded downstream (video_encoder_args(intermediate=True)):
+# fast preset, no B-frames, one reference, short lookahead. Never for delivered video
+# (-tune stillimage and the cut refs hurt the moving camera shots)
+LIBX264_INTERMEDIATE_ARGS = [
+    "-c:v", "libx264", "-preset", "veryfast", "-tune", "stillimage", "-threads", "0",
+    "-x264-params", "rc-lookahead=20:bframes=0:ref=1"
+]
+
+@lru_cache(maxsize=None)
+def _encoder_works(encoder: str) -> bool:
+    """
+    Encodes a few blank frames with the encoder. `ffmpeg -encoders` alone is not
+    enough: builds list h264_nvenc even on machines without an NVIDIA GPU.
+    """
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-f", "lavfi", "-i", "color=s=256x256:d=0.1",
+        *VIDEO_ENCODER_ARGS[encoder],
+        "-f", "null", "-"
+    ]
+    try:
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+    except OSError:
+        return False
+
+@lru_cache(maxsize=1)
+def select_video_encoder() -> str:
+    """VIDEO_ENCODER if set, else the first working hardware encoder, else libx264."""
+    if VIDEO_ENCODER in VIDEO_ENCODER_ARGS:
+        return VIDEO_ENCODER
+    for encoder in VIDEO_ENCODER_ARGS:
+        if encoder == "libx264" or _encoder_works(encoder):
+            return encoder
+    return "libx264"
+
+@lru_cache(maxsize=1)
+def use_cuda_scaling() -> bool:
+    """
+    VIDEO_HWSCALE=cuda/none forces it; auto runs a tiny scale_cuda graph, since
+    `ffmpeg -filters` lists scale_cuda on builds without a usable NVIDIA GPU.
+    """
+    if VIDEO_HWSCALE in ("cuda", "none"):
+        return VIDEO_HWSCALE == "cuda"
+    cmd = [
+        "ffmpeg", "-v", "error",
+        *CUDA_HW_DEVICE_ARGS,
+        "-f", "lavfi", "-i", "color=s=256x256:d=0.1",
+        "-vf", "format=yuv420p,hwupload,scale_cuda=512:-2,hwdownload,format=yuv420p",
+        "-f", "null", "-"
+    ]
+    try:
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+    except OSError:
+        return False
+
+def hw_device_args(cuda_scaling: Optional[bool] = None) -> List[str]:
+    """
+    Global ffmpeg options for commands whose filters come from build_video_filter:
+    the one CUDA device all scale_cuda scenes share (empty on the CPU templates).
+    """
+    if cuda_scaling is None:
+        cuda_scaling = use_cuda_scaling()
+    return CUDA_HW_DEVICE_ARGS if cuda_scaling else []
+
+def video_encoder_args(
+    encoder: Optional[str] = None,
+    encode_preset: Optional[str] = None,
+    intermediate: bool = False
+) -> List[str]:
+    """
+    FFmpeg video codec arguments for encoder (auto-selected if None).
+    encode_preset overrides the libx264 preset (e.g. "slow").
+    intermediate selects the fast libx264 profile, for clips re-encoded later.
+    """
+    encoder = encoder or select_video_encoder()
+    if encoder not in VIDEO_ENCODER_ARGS:
+        encoder = "libx264"
+    if encoder != "libx264":
+        return VIDEO_ENCODER_ARGS[encoder]
+    args = LIBX264_INTERMEDIATE_ARGS if intermediate else VIDEO_ENCODER_ARGS["libx264"]
+    if encode_preset:
+        args = list(args)
+        args[args.index("-preset") + 1] = encode_preset
+    return args
+
+# (path, mtime_ns, size) -> seconds; a rewritten file gets a fresh entry
+_duration_cache: Dict[tuple, float] = {}
+
+def _probe_duration(audio_path: str) -> float:
+    """Reads duration from the container headers (mutagen: MP3/WAV/MP4/...); ffprobe otherwise."""
+    try:
+        import mutagen
+        media = mutagen.File(audio_path)
+        if media is not None and media.info.length > 0:
+            return media.info.length
+    except Exception:
+        pass  # Not installed, or a format mutagen can't read
+
     cmd = [
         "ffprobe", "-v", "error", "-show_entries", "format=duration",
         "-of", "default=noprint_wrappers=1:nokey=1", audio_path
     ]
+    # stdout only, as bytes: float() parses the few-byte result directly
+    return float(subprocess.check_output(cmd, stderr=subprocess.DEVNULL))
+
+def get_audio_duration(audio_path: str) -> float:
+    """Helper to get audio duration; memoized per file version."""
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return float(result.stdout.strip())
+        st = os.stat(audio_path)
+        key = (audio_path, st.st_mtime_ns, st.st_size)
+        duration = _duration_cache.get(key)
+        if duration is None:
+            duration = _duration_cache[key] = _probe_duration(audio_path)
+        return duration
     except Exception:
         return 5.0 # Fallback
 
@@ -94,56 +256,89 @@ def get_camera_timing(emotion: str, duration: float) -> Dict:
     """
     camera_mode = EMOTION_TO_CAMERA.get(emotion.upper(), "STATIC")
     
-    # Determine intensity based on camera mode
-    intensity_map = {
-        "STATIC": "low",
-        "ZOOM_IN": "medium",
-        "ZOOM_OUT": "medium",
-        "PAN_LEFT": "low",
-        "PAN_RIGHT": "low",
-        "SHAKE": "high",
-        "SHAKE_AGRESSIVE": "high",
-        "ZOOM_IN_FAST": "high"
-    }
-    
     return {
         "action": camera_mode.lower(),
         "duration": duration,
-        "intensity": intensity_map.get(camera_mode, "low")
+        "intensity": CAMERA_INTENSITY.get(camera_mode, "low")
     }
 
+def build_video_filter(emotion: str, duration: float, cuda_scaling: Optional[bool] = None) -> str:
+    """
+    FFmpeg video filter for the emotion's camera move over duration seconds.
+    cuda_scaling selects the scale_cuda templates (auto-detected if None).
+    """
+    # MANDATORY: Compute frame count in Python
+    frames = math.ceil(duration * FPS)
+    
+    if cuda_scaling is None:
+        cuda_scaling = use_cuda_scaling()
+    return _build_vf(emotion.upper(), frames, cuda_scaling)
+
+@lru_cache(maxsize=256)
+def _build_vf(emotion: str, frames: int, cuda_scaling: bool) -> str:
+    """Rendered filter string; scenes sharing emotion and frame count reuse it."""
+    templates = CAMERA_TO_FILTER_FMT_CUDA if cuda_scaling else CAMERA_TO_FILTER_FMT
+    
+    camera_mode = EMOTION_TO_CAMERA.get(emotion, "STATIC")
+    filter_template = templates.get(camera_mode, templates["STATIC"])
+    
+    # Inject the frame count (fps/w/h are already in the template)
+    return filter_template.format(frames=frames)
+
+# Filter prefix that turns a single piped raw frame into an endless still
+RAW_IMAGE_LOOP = "loop=loop=-1:size=1,"
+
+def raw_image_input(image: np.ndarray) -> List[str]:
+    """
+    FFmpeg input arguments reading a BGR array as one raw frame from stdin
+    (send np.ascontiguousarray(image).tobytes() as the process input).
+    Prefix the video filter with RAW_IMAGE_LOOP to hold it as a still.
+    """
+    height, width = image.shape[:2]
+    return [
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}",
+        "-framerate", str(FPS), "-i", "pipe:0"
+    ]
+
 def generate_animation_command(
-    image_path: str,
+    image_path: Union[str, np.ndarray],
     audio_path: str,
     output_path: str,
-    emotion: str = "CALM"
+    emotion: str = "CALM",
+    duration: Optional[float] = None,
+    encoder: Optional[str] = None,
+    encode_preset: Optional[str] = None,
+    intermediate: bool = False
 ) -> List[str]:
     """
     Generates a deterministic FFmpeg command to animate a static image.
     Uses global settings from config.py.
+    Pass duration if the audio length is already known.
+    encoder is a VIDEO_ENCODER_ARGS key (auto-selected if None);
+    encode_preset overrides the libx264 preset; intermediate selects the fast
+    libx264 profile (only if the clip is re-encoded later, not for -c:v copy).
+    image_path may be a BGR array (e.g. VisualEnhancer.upscale_panel(...,
+    in_memory=True)): it is piped in raw, so run the command with
+    input=np.ascontiguousarray(image_path).tobytes().
     """
-    duration = get_audio_duration(audio_path)
-    # MANDATORY: Compute frame count in Python
-    frames = math.ceil(duration * FPS)
+    if duration is None:
+        duration = get_audio_duration(audio_path)
+    vf_filter = build_video_filter(emotion, duration)
     
-    camera_mode = EMOTION_TO_CAMERA.get(emotion.upper(), "STATIC")
-    filter_template = CAMERA_TO_FILTER.get(camera_mode, CAMERA_TO_FILTER["STATIC"])
-    
-    # Inject variables into filter string
-    vf_filter = filter_template.format(
-        frames=frames,
-        fps=FPS, 
-        w=WIDTH, 
-        h=HEIGHT
-    )
+    if isinstance(image_path, np.ndarray):
+        image_input = raw_image_input(image_path)
+        vf_filter = RAW_IMAGE_LOOP + vf_filter
+    else:
+        image_input = ["-loop", "1", "-i", image_path]
     
     cmd = [
         "ffmpeg", "-y",
-        "-loop", "1", "-i", image_path,
+        *hw_device_args(),
+        *image_input,
         "-i", audio_path,
         "-t", f"{duration:.3f}",
         "-vf", vf_filter,
-        "-c:v", "libx264",
+        *video_encoder_args(encoder, encode_preset, intermediate),
         "-pix_fmt", "yuv420p",
         "-r", str(FPS),  # MANDATORY: Enforce output FPS
         "-c:a", "aac",
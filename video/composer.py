@@ -1,97 +1,184 @@
 # composer.py - Professional FFmpeg Audio/Video Composer
 import subprocess
+import errno
+import logging
 import os
-from typing import List, Dict, Optional
-from config.config import OUTPUT_DIR, TEMP_DIR
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Dict, Optional, Union
+import numpy as np
+from config.config import FPS, OUTPUT_DIR, TEMP_DIR
+from video.animation_engine import (
+    RAW_IMAGE_LOOP, build_video_filter, get_audio_duration, hw_device_args, raw_image_input,
+    select_video_encoder, video_encoder_args
+)
 
-def concatenate_clips(clip_paths: List[str], output_filename: str) -> str:
-    """
-    Concatenates a list of MP4 clips into a single final video.
-    """
-    list_path = os.path.join(TEMP_DIR, "clips_list.txt")
-    with open(list_path, 'w') as f:
-        for clip in clip_paths:
-            f.write(f"file '{os.path.abspath(clip).replace(os.sep, '/')}'\n")
-            
-    raw_output = os.path.join(TEMP_DIR, f"raw_{output_filename}")
-    
+logger = logging.getLogger(__name__)
+
+def _remux_to_ts(clip_path: str) -> str:
+    """Lossless MP4 → MPEG-TS remux (Annex B H.264), so clips can be joined byte-wise."""
+    ts_path = os.path.splitext(clip_path)[0] + ".ts"
     cmd = [
         "ffmpeg", "-y",
-        "-f", "concat",
-        "-safe", "0",
-        "-i", list_path,
+        "-i", clip_path,
         "-c", "copy",
-        raw_output
+        "-bsf:v", "h264_mp4toannexb",
+        "-f", "mpegts",
+        ts_path
     ]
-    
-    print(f"🎬 Concatenating {len(clip_paths)} clips...")
     subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-    return raw_output
+    return ts_path
 
 
-def mix_scene_audio(
-    video_path: str,
+class ClipJoiner:
+    """
+    Joins MPEG-TS clips, in order, into one MP4 without re-encoding.
+    
+    With reuse_worker (default) a single long-lived ffmpeg reads the clips'
+    bytes on stdin and muxes the MP4 as they arrive, so clips can be fed while
+    later scenes are still rendering. Otherwise clips are collected, joined
+    byte-wise into a temp file and remuxed once on close().
+    MP4 clips are remuxed to TS on add(); clips rendered as .ts go straight in.
+    
+    Use as a context manager: an exception inside the block abort()s, so the
+    worker is never left waiting on stdin to write a truncated MP4 at exit.
+    """
+    
+    def __init__(self, output_path: str, reuse_worker: bool = True):
+        self.output_path = output_path
+        self.reuse_worker = reuse_worker
+        self._ts_paths: List[str] = []
+        self._worker = None
+        if reuse_worker:
+            self._worker = subprocess.Popen(
+                self._mux_command("pipe:0"),
+                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+            )
+    
+    def _mux_command(self, ts_input: str) -> List[str]:
+        return [
+            "ffmpeg", "-y", "-v", "error", "-nostats",
+            "-f", "mpegts", "-i", ts_input,
+            "-c", "copy",
+            "-bsf:a", "aac_adtstoasc",
+            "-movflags", "+faststart",
+            self.output_path
+        ]
+    
+    def add(self, clip_path: str):
+        """Appends the next clip (in output order)."""
+        ts_path = clip_path if clip_path.endswith(".ts") else _remux_to_ts(clip_path)
+        self._ts_paths.append(ts_path)
+        if self._worker is None:
+            return
+        with open(ts_path, 'rb') as f:
+            try:
+                shutil.copyfileobj(f, self._worker.stdin, length=1 << 20)
+            except BrokenPipeError:
+                pass  # Worker exited; close() reports its error
+    
+    def __enter__(self) -> "ClipJoiner":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+    
+    def abort(self):
+        """Kills the worker and removes the partial output (no-op once closed)."""
+        if self._worker is not None and self._worker.returncode is None:
+            self._worker.kill()
+            self._worker.communicate()
+            if os.path.exists(self.output_path):
+                os.remove(self.output_path)
+    
+    def close(self) -> str:
+        """Finishes the MP4; raises CalledProcessError if ffmpeg failed."""
+        logger.info("🎬 Concatenating %d clips...", len(self._ts_paths))
+        if self._worker is not None:
+            _, stderr = self._worker.communicate()  # Closes stdin: end of stream
+            if self._worker.returncode:
+                raise subprocess.CalledProcessError(
+                    self._worker.returncode, self._worker.args, stderr=stderr
+                )
+            return self.output_path
+        
+        joined_ts = os.path.join(TEMP_DIR, "clips_joined.ts")
+        with open(joined_ts, 'wb') as out:
+            for ts_path in self._ts_paths:
+                with open(ts_path, 'rb') as f:
+                    shutil.copyfileobj(f, out, length=1 << 20)
+        
+        subprocess.run(self._mux_command(joined_ts), check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        return self.output_path
+
+
+def concatenate_clips(clip_paths: List[str], output_filename: str, reuse_worker: bool = True) -> str:
+    """
+    Concatenates a list of MP4 clips into a single final video.
+    Clips are remuxed to MPEG-TS (in parallel), joined byte-wise and remuxed
+    once back to MP4: no re-encode, and unlike the concat demuxer it stays
+    correct when clips differ in SPS/timebase (e.g. NVENC vs libx264 clips).
+    """
+    with ThreadPoolExecutor(max_workers=min(8, len(clip_paths)) or 1) as pool:
+        ts_paths = list(pool.map(_remux_to_ts, clip_paths))
+    
+    with ClipJoiner(os.path.join(TEMP_DIR, f"raw_{output_filename}"), reuse_worker=reuse_worker) as joiner:
+        for ts_path in ts_paths:
+            joiner.add(ts_path)
+        return joiner.close()
+
+
+def _build_audio_mix(
     dialogue_path: str,
-    audio_params: Dict,
-    output_path: str,
-    narration_path: Optional[str] = None
-) -> str:
+    audio_params: "AudioDecision",
+    scene_duration: float,
+    narration_path: Optional[str] = None,
+    input_index: int = 1,
+    tag: str = "",
+    looped_source: Optional[Callable[[str], str]] = None
+):
     """
-    Professional audio mixing with FFmpeg.
+    Builds the audio layers of a scene as FFmpeg inputs + filtergraph.
     Implements all audio intelligence directives with 3-layer limit.
     
     Args:
-        video_path: Path to video clip (may have no audio)
         dialogue_path: Path to voiceover audio
-        audio_params: Output from AudioIntelligence.process_audio_intent()
-        output_path: Final output path
+        audio_params: AudioDecision from AudioIntelligence.process_audio_intent()
+        scene_duration: Scene length in seconds (BGM/ambience loop length)
         narration_path: Optional path to narration audio
+        input_index: FFmpeg index of the first audio input (video inputs come first)
+        tag: Suffix for every filter label (keeps scenes apart in one graph)
+        looped_source: Maps a BGM/ambience file to the label of a stream already
+            looped and trimmed to this scene; None adds a looped input per scene
         
     Returns:
-        Path to final mixed video
+        (inputs, filter_parts, audio_map)
     """
     
     # Extract parameters
-    bgm_file = audio_params.get("bgm_file")
-    ambience_file = audio_params.get("ambience_file")
-    sfx_file = audio_params.get("sfx_file")
-    sfx_timestamp = audio_params.get("sfx_timestamp", 0.0)
-    intro_stinger = audio_params.get("intro_stinger")
-    outro_stinger = audio_params.get("outro_stinger")
-    silence_before = audio_params.get("silence_before", 0.0)
-    duck_bgm = audio_params.get("duck_bgm", False)
-    layer_count = audio_params.get("layer_count", 1)
-    narration_placement = audio_params.get("narration_placement", "none")
-    narration_duck_amount = audio_params.get("narration_duck_amount", 0.3)
-    attack_audio = audio_params.get("attack_audio")
-    attack_timestamp = audio_params.get("attack_timestamp", 0.0)
-    personality_audio = audio_params.get("personality_audio")
-    personality_timestamp = audio_params.get("personality_timestamp", 0.0)
-    
-    print(f"🎵 Mixing audio: {layer_count} layers (dialogue + {layer_count-1} others)")
+    bgm_file = audio_params.bgm_file
+    ambience_file = audio_params.ambience_file
+    sfx_file = audio_params.sfx_file
+    sfx_timestamp = audio_params.sfx_timestamp
+    intro_stinger = audio_params.intro_stinger
+    outro_stinger = audio_params.outro_stinger
+    silence_before = audio_params.silence_before
+    duck_bgm = audio_params.duck_bgm
+    layer_count = audio_params.layer_count
+    narration_placement = audio_params.narration_placement
+    narration_duck_amount = audio_params.narration_duck_amount
+    attack_audio = audio_params.attack_audio
+    attack_timestamp = audio_params.attack_timestamp
+    personality_audio = audio_params.personality_audio
+    personality_timestamp = audio_params.personality_timestamp
     
-    # Get video duration
-    duration_cmd = [
-        "ffprobe", "-v", "error",
-        "-show_entries", "format=duration",
-        "-of", "default=noprint_wrappers=1:nokey=1",
-        video_path
-    ]
-    duration_result = subprocess.run(duration_cmd, capture_output=True, text=True)
-    scene_duration = float(duration_result.stdout.strip())
+    logger.info("🎵 Mixing audio: %d layers (dialogue + %d others)", layer_count, layer_count - 1)
     
-    # Build FFmpeg command
-    inputs = ["-i", video_path]
+    inputs = []
     filter_parts = []
     audio_inputs = []
-    input_index = 1  # Track input index (0 is video)
-    
-    # Add silence before scene if requested
-    if silence_before > 0:
-        print(f"🔇 Adding {silence_before:.2f}s silence before scene")
-        filter_parts.append(
-            f"anullsrc=r=44100:cl=stereo:d={silence_before}[silence]"
-        )
     
     # Add dialogue
     inputs.extend(["-i", dialogue_path])
@@ -107,92 +194,99 @@ def mix_scene_audio(
         if narration_placement == "before":
             # Concatenate narration before dialogue
             filter_parts.append(
-                f"[{narration_index}:a][{dialogue_index}:a]concat=n=2:v=0:a=1[dialogue_with_narration]"
+                f"[{narration_index}:a][{dialogue_index}:a]concat=n=2:v=0:a=1[dialogue_with_narration{tag}]"
             )
-            audio_inputs.append("dialogue_with_narration")
+            audio_inputs.append(f"dialogue_with_narration{tag}")
         elif narration_placement == "over":
             # Mix narration over dialogue (narration louder)
             filter_parts.append(
-                f"[{narration_index}:a]volume=1.0[narration_vol];"
-                f"[{dialogue_index}:a]volume=0.6[dialogue_ducked];"
-                f"[narration_vol][dialogue_ducked]amix=inputs=2:duration=longest[dialogue_with_narration]"
+                f"[{narration_index}:a]volume=1.0[narration_vol{tag}];"
+                f"[{dialogue_index}:a]volume=0.6[dialogue_ducked{tag}];"
+                f"[narration_vol{tag}][dialogue_ducked{tag}]amix=inputs=2:duration=longest[dialogue_with_narration{tag}]"
             )
-            audio_inputs.append("dialogue_with_narration")
+            audio_inputs.append(f"dialogue_with_narration{tag}")
         elif narration_placement == "after":
             # Concatenate dialogue before narration
             filter_parts.append(
-                f"[{dialogue_index}:a][{narration_index}:a]concat=n=2:v=0:a=1[dialogue_with_narration]"
+                f"[{dialogue_index}:a][{narration_index}:a]concat=n=2:v=0:a=1[dialogue_with_narration{tag}]"
             )
-            audio_inputs.append("dialogue_with_narration")
+            audio_inputs.append(f"dialogue_with_narration{tag}")
     else:
         # No narration, just use dialogue
         audio_inputs.append(f"{dialogue_index}:a")
     
+    # Add silence before scene if requested (the voice starts after the pause)
+    if silence_before > 0:
+        logger.info("🔇 Adding %.2fs silence before scene", silence_before)
+        filter_parts.append(
+            f"[{audio_inputs[0]}]adelay=delays={round(silence_before * 1000)}:all=1[dialogue_delayed{tag}]"
+        )
+        audio_inputs[0] = f"dialogue_delayed{tag}"
+    
     # Add BGM (looped to scene duration with seamless crossfade)
     if bgm_file and os.path.exists(bgm_file):
-        inputs.extend(["-stream_loop", "-1", "-t", str(scene_duration), "-i", bgm_file])
-        bgm_index = input_index
-        input_index += 1
+        if looped_source is None:
+            inputs.extend(["-stream_loop", "-1", "-t", str(scene_duration), "-i", bgm_file])
+            bgm_pad = f"{input_index}:a"
+            input_index += 1
+        else:
+            bgm_pad = looped_source(bgm_file)
         
         if duck_bgm or (narration_path and narration_placement == "over"):
             # Narrator-first: BGM is heavily ducked (0.2 volume) for atmospheric effect
             # BGM creates mood, narration tells the story
             duck_amount = 0.2  # Fixed 0.2 volume for narrator-first approach
             filter_parts.append(
-                f"[{bgm_index}:a]volume={duck_amount},afade=t=in:d=0.5,afade=t=out:st={scene_duration-0.5}:d=0.5[bgm_ducked]"
+                f"[{bgm_pad}]volume={duck_amount},afade=t=in:d=0.5,afade=t=out:st={scene_duration-0.5}:d=0.5[bgm_ducked{tag}]"
             )
-            audio_inputs.append("bgm_ducked")
+            audio_inputs.append(f"bgm_ducked{tag}")
         else:
             # No narration (rare case) - use normal BGM volume
             filter_parts.append(
-                f"[{bgm_index}:a]volume=0.3,afade=t=in:d=0.5,afade=t=out:st={scene_duration-0.5}:d=0.5[bgm_vol]"
+                f"[{bgm_pad}]volume=0.3,afade=t=in:d=0.5,afade=t=out:st={scene_duration-0.5}:d=0.5[bgm_vol{tag}]"
             )
-            audio_inputs.append("bgm_vol")
+            audio_inputs.append(f"bgm_vol{tag}")
     
     # Add Ambience (looped to scene duration)
     elif ambience_file and os.path.exists(ambience_file):
-        inputs.extend(["-stream_loop", "-1", "-t", str(scene_duration), "-i", ambience_file])
-        amb_index = input_index
-        input_index += 1
+        if looped_source is None:
+            inputs.extend(["-stream_loop", "-1", "-t", str(scene_duration), "-i", ambience_file])
+            amb_pad = f"{input_index}:a"
+            input_index += 1
+        else:
+            amb_pad = looped_source(ambience_file)
         filter_parts.append(
-            f"[{amb_index}:a]volume=0.2,afade=t=in:d=0.5,afade=t=out:st={scene_duration-0.5}:d=0.5[amb_vol]"
+            f"[{amb_pad}]volume=0.2,afade=t=in:d=0.5,afade=t=out:st={scene_duration-0.5}:d=0.5[amb_vol{tag}]"
         )
-        audio_inputs.append("amb_vol")
+        audio_inputs.append(f"amb_vol{tag}")
     
     # Add Impact SFX (at specific timestamp)
     if sfx_file and os.path.exists(sfx_file) and sfx_timestamp is not None:
         inputs.extend(["-itsoffset", str(sfx_timestamp), "-i", sfx_file])
         sfx_index = input_index
         input_index += 1
-        filter_parts.append(f"[{sfx_index}:a]volume=0.8[sfx_vol]")
-        audio_inputs.append("sfx_vol")
+        filter_parts.append(f"[{sfx_index}:a]volume=0.8[sfx_vol{tag}]")
+        audio_inputs.append(f"sfx_vol{tag}")
     
     # Add Intro Stinger (at start)
     elif intro_stinger and os.path.exists(intro_stinger):
         inputs.extend(["-i", intro_stinger])
         stinger_index = input_index
         input_index += 1
-        filter_parts.append(f"[{stinger_index}:a]volume=0.6[stinger_vol]")
-        audio_inputs.append("stinger_vol")
+        filter_parts.append(f"[{stinger_index}:a]volume=0.6[stinger_vol{tag}]")
+        audio_inputs.append(f"stinger_vol{tag}")
     
     # Add Outro Stinger (at end with offset)
     elif outro_stinger and os.path.exists(outro_stinger):
-        # Get stinger duration to calculate offset
-        stinger_dur_cmd = [
-            "ffprobe", "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            outro_stinger
-        ]
-        stinger_dur_result = subprocess.run(stinger_dur_cmd, capture_output=True, text=True)
-        stinger_duration = float(stinger_dur_result.stdout.strip())
+        # Get stinger duration to calculate offset (memoized; stingers repeat across scenes)
+        stinger_duration = get_audio_duration(outro_stinger)
         stinger_offset = max(0, scene_duration - stinger_duration)
         
         inputs.extend(["-itsoffset", str(stinger_offset), "-i", outro_stinger])
         stinger_index = input_index
         input_index += 1
-        filter_parts.append(f"[{stinger_index}:a]volume=0.6[stinger_vol]")
-        audio_inputs.append("stinger_vol")
+        filter_parts.append(f"[{stinger_index}:a]volume=0.6[stinger_vol{tag}]")
+        audio_inputs.append(f"stinger_vol{tag}")
     
     # ═══════════════════════════════════════════════════════════
     # CHARACTER AUDIO (ATTACK + PERSONALITY)
@@ -203,68 +297,338 @@ def mix_scene_audio(
         inputs.extend(["-itsoffset", str(attack_timestamp), "-i", attack_audio])
         attack_index = input_index
         input_index += 1
-        filter_parts.append(f"[{attack_index}:a]volume=-4dB[attack_vol]")
-        audio_inputs.append("attack_vol")
-        print(f"🎯 Adding attack audio @ {attack_timestamp}s (-4dB)")
+        filter_parts.append(f"[{attack_index}:a]volume=-4dB[attack_vol{tag}]")
+        audio_inputs.append(f"attack_vol{tag}")
+        logger.info("🎯 Adding attack audio @ %ss (-4dB)", attack_timestamp)
     
     # Add Personality Cue (at specific timestamp, -8dB)
     if personality_audio and os.path.exists(personality_audio) and personality_timestamp is not None:
         inputs.extend(["-itsoffset", str(personality_timestamp), "-i", personality_audio])
         personality_index = input_index
         input_index += 1
-        filter_parts.append(f"[{personality_index}:a]volume=-8dB[personality_vol]")
-        audio_inputs.append("personality_vol")
-        print(f"🎭 Adding personality cue @ {personality_timestamp}s (-8dB)")
+        filter_parts.append(f"[{personality_index}:a]volume=-8dB[personality_vol{tag}]")
+        audio_inputs.append(f"personality_vol{tag}")
+        logger.info("🎭 Adding personality cue @ %ss (-8dB)", personality_timestamp)
     
     # Final mix (max 4 audio layers: dialogue + attack/SFX + BGM + personality)
     if len(audio_inputs) > 1:
         mix_inputs = "".join(f"[{inp}]" for inp in audio_inputs)
         filter_parts.append(
-            f"{mix_inputs}amix=inputs={len(audio_inputs)}:duration=longest:dropout_transition=0,volume=1.0[final_audio]"
+            f"{mix_inputs}amix=inputs={len(audio_inputs)}:duration=longest:dropout_transition=0,volume=1.0[final_audio{tag}]"
         )
-        audio_map = "[final_audio]"
+        audio_map = f"[final_audio{tag}]"
     else:
-        audio_map = audio_inputs[0] if audio_inputs else f"{dialogue_index}:a"
+        # Filter outputs need brackets for -map; input streams ("1:a") don't
+        audio_map = audio_inputs[0] if ":" in audio_inputs[0] else f"[{audio_inputs[0]}]"
     
-    # Combine filters
-    filter_complex = ";".join(filter_parts) if filter_parts else None
     
-    # Build final command
-    cmd = ["ffmpeg", "-y"] + inputs
+    return inputs, filter_parts, audio_map
+
+
+def mix_scene_audio(
+    video_path: str,
+    dialogue_path: str,
+    audio_params: "AudioDecision",
+    output_path: str,
+    narration_path: Optional[str] = None,
+    scene_duration: Optional[float] = None
+) -> str:
+    """
+    Professional audio mixing with FFmpeg.
+    Implements all audio intelligence directives with 3-layer limit.
+    
+    Args:
+        video_path: Path to video clip (may have no audio)
+        dialogue_path: Path to voiceover audio
+        audio_params: AudioDecision from AudioIntelligence.process_audio_intent()
+        output_path: Final output path
+        narration_path: Optional path to narration audio
+        scene_duration: Video duration, if already known (probed otherwise)
+        
+    Returns:
+        Path to final mixed video
+    """
+    
+    # Get video duration
+    if scene_duration is None:
+        scene_duration = get_audio_duration(video_path)
     
-    if filter_complex:
-        cmd.extend(["-filter_complex", filter_complex])
+    audio_inputs, filter_parts, audio_map = _build_audio_mix(
+        dialogue_path, audio_params, scene_duration, narration_path
+    )
     
-    cmd.extend([
+    # Build final command in one list (single filter join, no concatenated copies)
+    cmd = [
+        "ffmpeg", "-y", "-i", video_path,
+        *audio_inputs,
+        *(["-filter_complex", ";".join(filter_parts)] if filter_parts else []),
         "-map", "0:v",  # Video from first input
         "-map", audio_map,  # Mixed audio
         "-c:v", "copy",  # Copy video codec
         "-c:a", "aac",  # Encode audio to AAC
         "-b:a", "192k",  # Audio bitrate
         output_path
-    ])
+    ]
     
     subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-    print(f"✅ Audio mixed: {output_path}")
+    logger.info("✅ Audio mixed: %s", output_path)
+    
+    return output_path
+
+
+@dataclass(slots=True)
+class SceneSpec:
+    """Everything needed to render one scene (input to render_chapter)."""
+    image_path: str
+    dialogue_path: str
+    audio_params: "AudioDecision"
+    emotion: str = "CALM"
+    duration: Optional[float] = None
+    narration_path: Optional[str] = None
+
+
+def _run_encode(command, encoder: str, output_path: str, stdin_data: Optional[bytes] = None):
+    """Runs command(encoder); retries with libx264 if a hardware encoder fails."""
+    try:
+        subprocess.run(command(encoder), input=stdin_data, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except subprocess.CalledProcessError:
+        if encoder == "libx264":
+            raise
+        # Hardware encoder out of sessions/memory: software encode instead
+        logger.warning("⚠️ %s failed, re-encoding with libx264: %s", encoder, output_path)
+        subprocess.run(command("libx264"), input=stdin_data, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def _scene_length(dialogue_path: str, audio_params: "AudioDecision", duration: Optional[float]) -> float:
+    """Scene length: the dialogue plus any silence requested before it."""
+    if duration is None:
+        duration = get_audio_duration(dialogue_path)
+    return duration + audio_params.silence_before
+
+
+def render_scene(
+    image_path: Union[str, np.ndarray],
+    dialogue_path: str,
+    audio_params: "AudioDecision",
+    output_path: str,
+    emotion: str = "CALM",
+    duration: Optional[float] = None,
+    narration_path: Optional[str] = None,
+    encoder: Optional[str] = None,
+    encode_preset: Optional[str] = None
+) -> str:
+    """
+    Animates a panel and mixes its audio in a single FFmpeg pass.
+    Same result as generate_animation_command + mix_scene_audio, without
+    the intermediate clip, its second process spawn, or the re-mux.
+    
+    Args:
+        image_path: Reference panel to animate (path, or BGR array piped in raw)
+        dialogue_path: Path to voiceover audio
+        audio_params: AudioDecision from AudioIntelligence.process_audio_intent()
+        output_path: Final output path
+        emotion: Scene emotion (selects the camera move)
+        duration: Dialogue duration; probed from dialogue_path if None
+        narration_path: Optional path to narration audio
+        encoder: VIDEO_ENCODER_ARGS key (auto-selected if None)
+        encode_preset: libx264 preset override
+        
+    Returns:
+        Path to final mixed video
+    """
+    if encoder is None:
+        encoder = select_video_encoder()
+    duration = _scene_length(dialogue_path, audio_params, duration)
+    
+    audio_inputs, filter_parts, audio_map = _build_audio_mix(
+        dialogue_path, audio_params, duration, narration_path
+    )
+    
+    # Camera move on the looped still; trim ends the video at the scene length
+    # while the audio layers keep their own (longest) length, as in the 2-pass mix
+    video_filter = build_video_filter(emotion, duration)
+    stdin_data = None
+    if isinstance(image_path, np.ndarray):
+        image_input = raw_image_input(image_path)
+        video_filter = RAW_IMAGE_LOOP + video_filter
+        stdin_data = np.ascontiguousarray(image_path).tobytes()
+    else:
+        image_input = ["-loop", "1", "-t", f"{duration:.3f}", "-i", image_path]
+    filter_parts.insert(0, f"[0:v]{video_filter},trim=duration={duration:.3f}[video]")
+    
+    def command(encoder):
+        return [
+            "ffmpeg", "-y",
+            *hw_device_args(),
+            *image_input,
+            *audio_inputs,
+            "-filter_complex", ";".join(filter_parts),
+            "-map", "[video]",
+            "-map", audio_map,
+            *video_encoder_args(encoder, encode_preset),
+            "-pix_fmt", "yuv420p",
+            "-r", str(FPS),  # MANDATORY: Enforce output FPS
+            "-c:a", "aac",
+            "-b:a", "192k",
+            output_path
+        ]
+    
+    _run_encode(command, encoder, output_path, stdin_data)
+    logger.info("✅ Scene rendered: %s", output_path)
     
     return output_path
 
 
+def render_chapter(
+    scenes: List[SceneSpec],
+    output_path: str,
+    encoder: Optional[str] = None,
+    encode_preset: Optional[str] = None
+) -> str:
+    """
+    Renders every scene of a chapter and joins them in ONE FFmpeg job:
+    per-scene camera move + audio mix, then a single concat, encoded once.
+    No per-scene clips, no concat list, no re-mux.
+    
+    Each scene's audio is padded/trimmed to its video length so the
+    scenes stay in sync across the concat.
+    
+    Args:
+        scenes: Scenes in playback order
+        output_path: Final output path
+        encoder: VIDEO_ENCODER_ARGS key (auto-selected if None)
+        encode_preset: libx264 preset override
+        
+    Returns:
+        Path to the chapter video
+    """
+    if encoder is None:
+        encoder = select_video_encoder()
+    
+    inputs = []
+    filter_parts = []
+    segments = []
+    input_index = 0
+    # (label, file, chapter start, duration) of every scene's BGM/ambience layer
+    looped_uses: List[tuple] = []
+    chapter_time = 0.0
+    for k, scene in enumerate(scenes):
+        duration = _scene_length(scene.dialogue_path, scene.audio_params, scene.duration)
+        
+        inputs.extend(["-loop", "1", "-t", f"{duration:.3f}", "-i", scene.image_path])
+        video_index = input_index
+        input_index += 1
+        
+        def looped_source(path, k=k, start=chapter_time, duration=duration):
+            label = f"loop_{k}_{len(looped_uses)}"
+            looped_uses.append((label, path, start, duration))
+            return label
+        
+        audio_inputs, audio_filters, audio_map = _build_audio_mix(
+            scene.dialogue_path, scene.audio_params, duration, scene.narration_path,
+            input_index=input_index, tag=f"_{k}", looped_source=looped_source
+        )
+        inputs.extend(audio_inputs)
+        input_index += audio_inputs.count("-i")
+        
+        if not audio_map.startswith("["):
+            audio_map = f"[{audio_map}]"
+        filter_parts.append(
+            f"[{video_index}:v]{build_video_filter(scene.emotion, duration)},"
+            f"trim=duration={duration:.3f},setpts=PTS-STARTPTS,format=yuv420p,setsar=1[v_{k}]"
+        )
+        filter_parts.extend(audio_filters)
+        filter_parts.append(
+            f"{audio_map}aformat=sample_rates=44100:channel_layouts=stereo,"
+            f"apad,atrim=duration={duration:.3f},asetpts=PTS-STARTPTS[a_{k}]"
+        )
+        segments.append(f"[v_{k}][a_{k}]")
+        chapter_time += duration
+    
+    # Each scene's layer is its own input, seeked to the scene's chapter time so the
+    # music flows across scenes. Not one shared input split per scene: concat reads
+    # scenes in turn, so the split's later branches would queue decoded PCM for the
+    # rest of the chapter
+    for label, path, start, duration in looped_uses:
+        length = get_audio_duration(path)
+        offset = start % length if length > 0 else 0.0  # -ss only seeks the first loop
+        inputs.extend([
+            "-stream_loop", "-1", "-ss", f"{offset:.3f}", "-t", f"{duration:.3f}", "-i", path
+        ])
+        filter_parts.append(f"[{input_index}:a]anull[{label}]")
+        input_index += 1
+    
+    filter_parts.append(f"{''.join(segments)}concat=n={len(scenes)}:v=1:a=1[video][audio]")
+    
+    # The graph grows with the chapter; a script file avoids command-line length limits
+    script_path = os.path.join(TEMP_DIR, "chapter_filter.txt")
+    with open(script_path, 'w') as f:
+        f.write(";\n".join(filter_parts))
+    
+    def command(encoder):
+        return [
+            "ffmpeg", "-y",
+            *hw_device_args(),
+            *inputs,
+            "-filter_complex_script", script_path,
+            "-map", "[video]",
+            "-map", "[audio]",
+            *video_encoder_args(encoder, encode_preset),
+            "-pix_fmt", "yuv420p",
+            "-r", str(FPS),  # MANDATORY: Enforce output FPS
+            "-c:a", "aac",
+            "-b:a", "192k",
+            "-movflags", "+faststart",
+            output_path
+        ]
+    
+    logger.info("🎬 Rendering %d scenes in one pass...", len(scenes))
+    _run_encode(command, encoder, output_path)
+    logger.info("✅ Chapter rendered: %s", output_path)
+    
+    return output_path
+
+
+def _move_file(src: str, dst: str):
+    """Rename when on the same filesystem; otherwise an in-kernel sendfile copy."""
+    try:
+        os.replace(src, dst)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        size = os.fstat(fin.fileno()).st_size
+        offset = 0
+        try:
+            while offset < size:
+                sent = os.sendfile(fout.fileno(), fin.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except (AttributeError, OSError):
+            # No sendfile (e.g. Windows); plain buffered copy from where it stopped
+            fin.seek(offset)
+            fout.seek(offset)
+            shutil.copyfileobj(fin, fout, length=1 << 20)
+    os.remove(src)
+
+
 def finalize_video(raw_video: str, output_filename: str) -> str:
     """
     Final processing and move to output directory.
     """
     final_path = os.path.join(OUTPUT_DIR, output_filename)
     
-    # Simple copy if no further processing needed
-    cmd = [
-        "ffmpeg", "-y",
-        "-i", raw_video,
-        "-c", "copy",
-        final_path
-    ]
-    
-    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-    print(f"🎉 Final video: {final_path}")
+    if os.path.splitext(raw_video)[1].lower() != os.path.splitext(final_path)[1].lower():
+        # Container change: stream-copy remux, no re-encode
+        cmd = ["ffmpeg", "-y", "-i", raw_video, "-c", "copy", final_path]
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        os.remove(raw_video)
+    else:
+        # Same container: nothing to re-mux, just move the bytes (or not at all)
+        _move_file(raw_video, final_path)
+    logger.info("🎉 Final video: %s", final_path)
     
     return final_path